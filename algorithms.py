@@ -1,5 +1,10 @@
 import math
+from bisect import bisect_right
+from contextlib import nullcontext
+from heapq import heappop, heappush
 from helpers import Box
+from placement import MaxRectsBin, PackingBin, SkylineBin
+from structures import BestFitIndex, FirstFitIndex, FloorCeilingShelf, SpaceIndex
 
 class Algorithms:
     '''
@@ -18,307 +23,501 @@ class Algorithms:
         - FBL - Finite Bottom-left
         - NBL - Next Bottom-left
         - AD - Alternate Directions
+        - MRBSSF, MRBAF, MRBL, MRCP - MaxRects with Best Short Side Fit, Best Area Fit,
+        Bottom-left and Contact Point
+        - SKBL, SKMW - Skyline Bottom-left and Min Waste
+
+    Every algorithm takes `(bin_size, boxes, progress=None, stats=None, allow_rotation=False)`, where\\
+    `progress(done, total)` is called after each box is handled.
+    Raising an exception from it stops the algorithm.
+    `stats` is an optional SolveStats which gets phase timings and counters.
+    The boxes list is sorted in place into the order the boxes are packed in.
+    With `allow_rotation` boxes may be turned by 90 degrees, their w and h are swapped then.
+    Boxes only fitting the bin on their side are always turned. Shelf algorithms
+    stand a box up when it would open a new shelf but fits an existing one standing.
+    A new shelf takes the box as it comes, so boxes which are already standing,
+    like tall thin ones, get the same bins as without rotation. The bottom-left
+    family tests both orientations at each candidate position, but NBL only stands
+    boxes up and AD only lays them down, the turns which keep their sort order.
+    Skyline bins lose the space below their boxes, so SKBL and SKMW often need
+    more bins than HBF, most with many small boxes or a mix of sizes.
     '''
     @staticmethod
     def get_implemented_names():
-        return ["HFF", "HNF", "HBF", "FBL", "NBL", "AD"]
+        return ["HFF", "HNF", "HBF", "FC", "FNF", "FFF", "FBL", "NBL", "AD",
+                "MRBSSF", "MRBAF", "MRBL", "MRCP", "SKBL", "SKMW"]
     
     @staticmethod
-    def HFF(bin_size: tuple, boxes: list[Box]) -> list[list[Box]]:
+    def HFF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
         '''Hybrid First-Fit'''
         # First phase: FFDH algorithm to create a strip packing
-        strips = Algorithms.__FFDH(boxes, bin_width=bin_size[0])
+        if allow_rotation:
+            Algorithms.__turn_oversized(boxes, bin_size)
+        with Algorithms.__phase(stats, "strips"):
+            strips = Algorithms.__FFDH(boxes, bin_width=bin_size[0], progress=progress, rotate=allow_rotation)
         # Second phase: FFD algorithm to create finite bin packing solutions
-        bins_with_strips = Algorithms.__FFD(strips, bin_height=bin_size[1])
-        return Algorithms.__unstrip_bins(bins_with_strips)
+        with Algorithms.__phase(stats, "bins"):
+            bins_with_strips = Algorithms.__FFD(strips, bin_height=bin_size[1])
+        with Algorithms.__phase(stats, "unstrip"):
+            bins = Algorithms.__unstrip_bins(bins_with_strips)
+        if stats:
+            stats.count("strips_opened", len(strips))
+            stats.count("bins_opened", len(bins))
+        return bins
 
     @staticmethod
-    def HNF(bin_size: tuple, boxes: list[Box]) -> list[list[Box]]:
+    def HNF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
         '''Hybrid Next-Fit'''
         # First phase: NFDH algorithm to create a strip packing
-        strips = Algorithms.__NFDH(boxes, bin_width=bin_size[0])
+        if allow_rotation:
+            Algorithms.__turn_oversized(boxes, bin_size)
+        with Algorithms.__phase(stats, "strips"):
+            strips = Algorithms.__NFDH(boxes, bin_width=bin_size[0], progress=progress, rotate=allow_rotation)
         # Second phase: NFD algorithm to create finite bin packing solutions
-        bins_with_strips = Algorithms.__NFD(strips, bin_height=bin_size[1])
-        return Algorithms.__unstrip_bins(bins_with_strips)
+        with Algorithms.__phase(stats, "bins"):
+            bins_with_strips = Algorithms.__NFD(strips, bin_height=bin_size[1])
+        with Algorithms.__phase(stats, "unstrip"):
+            bins = Algorithms.__unstrip_bins(bins_with_strips)
+        if stats:
+            stats.count("strips_opened", len(strips))
+            stats.count("bins_opened", len(bins))
+        return bins
 
     @staticmethod
-    def HBF(bin_size: tuple, boxes: list[Box]) -> list[list[Box]]:
+    def HBF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
         '''Hybrid Best-Fit'''
         # First phase: BFDH algorithm to create a strip packing
-        strips = Algorithms.__BFDH(boxes, bin_width=bin_size[0])
+        if allow_rotation:
+            Algorithms.__turn_oversized(boxes, bin_size)
+        with Algorithms.__phase(stats, "strips"):
+            strips = Algorithms.__BFDH(boxes, bin_width=bin_size[0], progress=progress, rotate=allow_rotation)
         # Second phase: BFD algorithm to create finite bin packing solutions
-        bins_with_strips = Algorithms.__BFD(strips, bin_height=bin_size[1])
-        return Algorithms.__unstrip_bins(bins_with_strips)
+        with Algorithms.__phase(stats, "bins"):
+            bins_with_strips = Algorithms.__BFD(strips, bin_height=bin_size[1])
+        with Algorithms.__phase(stats, "unstrip"):
+            bins = Algorithms.__unstrip_bins(bins_with_strips)
+        if stats:
+            stats.count("strips_opened", len(strips))
+            stats.count("bins_opened", len(bins))
+        return bins
 
     @staticmethod
-    def FC(bin_size: tuple, boxes: list[Box]):
+    def FC(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
         '''Floor-Ceiling'''
-        pass
+        # First phase: floor-ceiling packing of the strips
+        if allow_rotation:
+            Algorithms.__turn_oversized(boxes, bin_size)
+        with Algorithms.__phase(stats, "strips"):
+            strips = Algorithms.__FCDH(boxes, bin_width=bin_size[0], progress=progress)
+        # Second phase: BFD algorithm to create finite bin packing solutions
+        with Algorithms.__phase(stats, "bins"):
+            bins_with_strips = Algorithms.__BFD(strips, bin_height=bin_size[1])
+        with Algorithms.__phase(stats, "unstrip"):
+            bins = Algorithms.__stack_strips(bins_with_strips)
+        if stats:
+            stats.count("strips_opened", len(strips))
+            stats.count("bins_opened", len(bins))
+        return bins
 
     @staticmethod
-    def FBL(bin_size: tuple, boxes: list[Box]) -> list[list[Box]]:
-        '''Finite Bottom-left'''
-        boxes.sort(key=lambda box: box.w, reverse=True)  # Sort boxes by width in decreasing order
-            
-        bins = []
-
-        def fits_in_bin(bin, box):
-            for b in bin:
-                if not (b.x + b.w <= box.x or b.x >= box.x + box.w or b.y + b.h <= box.y or b.y >= box.y + box.h):
-                    return False
-            return True
-
-        def find_position(bin, box):
-            max_x, max_y = bin_size
-            for y in range(max_y):
-                for x in range(max_x):
-                    box.x, box.y = x, y
-                    if x + box.w <= max_x and y + box.h <= max_y and fits_in_bin(bin, box):
-                        return True
-            return False
+    def FNF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''Finite Next-Fit'''
+        bin_width, bin_height = bin_size
+        if allow_rotation:
+            Algorithms.__turn_oversized(boxes, bin_size)
+        boxes.sort(key=lambda box: box.h, reverse=True)  # Sort boxes by height in decreasing order
 
-        for box in boxes:
-            placed = False
-            for bin in bins:
-                if find_position(bin, box):
-                    bin.append(box)
-                    placed = True
-                    break
-            if not placed:
-                new_bin = []
-                if find_position(new_bin, box):
-                    new_bin.append(box)
-                    bins.append(new_bin)
-        bins = [bin for bin in bins if bin]
+        bins: list[list[Box]] = []
+        shelves = 0
+        shelf_x = shelf_y = shelf_h = 0 # Current shelf of the current bin
+
+        with Algorithms.__phase(stats, "packing"):
+            for done, box in enumerate(boxes, 1):
+                if (allow_rotation and bins and box.h < box.w <= shelf_h
+                        and shelf_x + box.w > bin_width >= shelf_x + box.h):
+                    box.w, box.h = box.h, box.w # Stand the box up to stay on the shelf
+                if not bins or shelf_x + box.w > bin_width:
+                    # The box is the highest one of a new shelf, on top of the current one or in a new bin
+                    if bins and shelf_y + shelf_h + box.h <= bin_height:
+                        shelf_y += shelf_h
+                    else:
+                        bins.append([])
+                        shelf_y = 0
+                    shelf_x, shelf_h = 0, box.h
+                    shelves += 1
+                box.x, box.y = shelf_x, shelf_y
+                shelf_x += box.w
+                bins[-1].append(box)
+                if progress:
+                    progress(done, len(boxes))
+        if stats:
+            stats.count("strips_opened", shelves)
+            stats.count("bins_opened", len(bins))
         return bins
 
+    @staticmethod
+    def FFF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''Finite First-Fit'''
+        bin_width, bin_height = bin_size
+        if allow_rotation:
+            Algorithms.__turn_oversized(boxes, bin_size)
+        boxes.sort(key=lambda box: box.h, reverse=True)  # Sort boxes by height in decreasing order
 
+        bins: list[list[Box]] = []
+        bin_shelves: list[list[int]] = []       # y of the shelves of each bin
+        shelf_space: list[FirstFitIndex] = []   # Width left on the shelves of each bin
+        bin_shelf_space = FirstFitIndex()       # Widest shelf space of each bin
+        bin_space = FirstFitIndex()             # Height left in each bin
+        shelves = 0
+        # All the shelves in opening order for standing boxes up, only with allow_rotation
+        all_shelves: list[tuple] = []           # (bin, shelf) of each shelf
+        shelf_index: list[list[int]] = []       # Position of the shelves of each bin in all_shelves
+        all_heights: list[int] = []             # Negated heights of the shelves, increasing
+        all_space = FirstFitIndex()             # Width left on each shelf
+
+        with Algorithms.__phase(stats, "packing"):
+            for done, box in enumerate(boxes, 1):
+                # Lowest shelf of the first bin that can hold the box, boxes never get higher than the shelves
+                i = bin_shelf_space.first_fit(box.w)
+                if i is not None:
+                    j = shelf_space[i].first_fit(box.w)
+                elif allow_rotation:
+                    k = Algorithms.__stand_up(box, all_heights, all_space)
+                    if k is not None:
+                        i, j = all_shelves[k]
+                if i is not None:
+                    space = shelf_space[i][j]
+                    box.x, box.y = bin_width - space, bin_shelves[i][j]
+                    shelf_space[i][j] = space - box.w
+                    if allow_rotation:
+                        all_space[shelf_index[i][j]] = space - box.w
+                else:
+                    # New shelf in the first bin with enough height left
+                    i = bin_space.first_fit(box.h)
+                    if i is None:
+                        i = len(bins)
+                        bins.append([])
+                        bin_shelves.append([])
+                        shelf_index.append([])
+                        shelf_space.append(FirstFitIndex())
+                        bin_shelf_space.append(0)
+                        bin_space.append(bin_height)
+                    box.x, box.y = 0, bin_height - bin_space[i]
+                    bin_shelves[i].append(box.y)
+                    shelf_space[i].append(bin_width - box.w)
+                    bin_space[i] -= box.h
+                    shelves += 1
+                    if allow_rotation:
+                        shelf_index[i].append(len(all_shelves))
+                        all_shelves.append((i, len(bin_shelves[i]) - 1))
+                        all_heights.append(-box.h)
+                        all_space.append(bin_width - box.w)
+                bins[i].append(box)
+                bin_shelf_space[i] = shelf_space[i].max()
+                if progress:
+                    progress(done, len(boxes))
+        if stats:
+            stats.count("strips_opened", shelves)
+            stats.count("bins_opened", len(bins))
+        return bins
 
     @staticmethod
-    def NBL(bin_size: tuple, boxes: list[Box]) -> list[list[Box]]:
-        '''Next Bottom-left'''
+    def FBL(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''Finite Bottom-left'''
         boxes.sort(key=lambda box: box.w, reverse=True)  # Sort boxes by width in decreasing order
 
-        bins = []
+        bins: list[PackingBin] = []
+        space = SpaceIndex(bin_size)  # Bins with less free area than the box are skipped without a search
+        starts = {}
+
+        with Algorithms.__phase(stats, "packing"):
+            for done, box in enumerate(boxes, 1):
+                i = Algorithms.__first_bin(bins, space, box, starts, direction='bottom', rotate=allow_rotation)
+                if i is None:
+                    new_bin = PackingBin(bin_size, stats)
+                    if new_bin.place(box, rotate=allow_rotation):
+                        bins.append(new_bin)
+                        space.append(new_bin.free_space)
+                if progress:
+                    progress(done, len(boxes))
+        if stats:
+            stats.count("bins_opened", len(bins))
+        return [bin.boxes for bin in bins]
 
-        def fits_in_bin(bin, box):
-            for b in bin:
-                if not (b.x + b.w <= box.x or b.x >= box.x + box.w or b.y + b.h <= box.y or b.y >= box.y + box.h):
-                    return False
-            return True
-
-        def find_position(bin, box):
-            max_x, max_y = bin_size
-            for y in range(max_y):
-                for x in range(max_x):
-                    box.x, box.y = x, y
-                    if x + box.w <= max_x and y + box.h <= max_y and fits_in_bin(bin, box):
-                        return True
-            return False
-
-        current_bin = []
+    @staticmethod
+    def NBL(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''Next Bottom-left'''
+        boxes.sort(key=lambda box: box.w, reverse=True)  # Sort boxes by width in decreasing order
 
-        for box in boxes:
-            if not find_position(current_bin, box):
-                bins.append(current_bin)
-                current_bin = []
-                find_position(current_bin, box)
-            current_bin.append(box)
-
-        if current_bin:
-            bins.append(current_bin)
-        bins = [bin for bin in bins if bin]
-        return bins
+        bins: list[PackingBin] = []
+        current_bin = PackingBin(bin_size, stats)
+
+        with Algorithms.__phase(stats, "packing"):
+            for done, box in enumerate(boxes, 1):
+                # Only standing up keeps the boxes in decreasing width, a box turned wider
+                # spoils the rest of the only open bin
+                rotate = allow_rotation and box.w > box.h
+                if not current_bin.place(box, rotate=rotate):
+                    bins.append(current_bin)
+                    current_bin = PackingBin(bin_size, stats)
+                    current_bin.place(box, rotate=rotate)
+                if progress:
+                    progress(done, len(boxes))
+
+        bins.append(current_bin)
+        bins = [bin for bin in bins if bin.boxes]
+        if stats:
+            stats.count("bins_opened", len(bins))
+        return [bin.boxes for bin in bins]
     
     @staticmethod
-    def AD(bin_size: tuple, boxes: list[Box]):
+    def AD(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False):
         '''Alternate Directions'''
         total_area = sum(box.w * box.h for box in boxes)
         bin_area = bin_size[0] * bin_size[1]
         L = math.ceil(total_area / bin_area)
-        bins = [[] for _ in range(L)]
-
-        def fits_in_bin(bin, box):
-            for b in bin:
-                if not (b.x + b.w <= box.x or b.x >= box.x + box.w or b.y + b.h <= box.y or b.y >= box.y + box.h):
-                    return False
-            return True
-
-        def find_position(bin, box, direction='bottom'):
-            max_x, max_y = bin_size
-            if direction == 'bottom':
-                for y in range(max_y):
-                    for x in range(max_x):
-                        box.x, box.y = x, y
-                        if x + box.w <= max_x and y + box.h <= max_y and fits_in_bin(bin, box):
-                            return True
-            elif direction == 'left_to_right':
-                for x in range(max_x):
-                    for y in range(max_y):
-                        box.x, box.y = x, y
-                        if x + box.w <= max_x and y + box.h <= max_y and fits_in_bin(bin, box):
-                            return True
-            elif direction == 'right_to_left':
-                for x in range(max_x - 1, -1, -1):
-                    for y in range(max_y):
-                        box.x, box.y = x, y
-                        if x + box.w <= max_x and y + box.h <= max_y and fits_in_bin(bin, box):
-                            return True
-            return False
+        bins = [PackingBin(bin_size, stats) for _ in range(L)]
+        space = SpaceIndex(bin_size)
+        for bin in bins:
+            space.append(bin.free_space)
+        starts = {}
 
         # Sort boxes by decreasing height
         boxes.sort(key=lambda box: box.h, reverse=True)
 
-        # Pack first L bins using BFD
-        packed = []
-        for box in boxes:
-            placed = False
-            for bin in bins:
-                if find_position(bin, box, direction='bottom'):
-                    bin.append(box)
-                    packed.append(box)
-                    placed = True
+        # Pack first L bins using BFD, up to the first box that does not fit
+        packed = 0
+        with Algorithms.__phase(stats, "first_bins"):
+            for box in boxes:
+                # Only lying down keeps the boxes in decreasing height, like in NBL
+                rotate = allow_rotation and box.h > box.w
+                if Algorithms.__first_bin(bins, space, box, starts, direction='bottom', rotate=rotate) is None:
                     break
-            if not placed:
-                break
-
-        remaining_boxes = [box for box in boxes if box not in packed]
+                packed += 1
+                if progress:
+                    progress(packed, len(boxes))
 
         # Pack remaining items in alternate directions
         direction = 'left_to_right'
         current_bin_index = 0
-        while remaining_boxes:
-            current_box = remaining_boxes.pop(0)
-            placed = False
-            while current_bin_index < len(bins):
-                if find_position(bins[current_bin_index], current_box, direction=direction):
-                    bins[current_bin_index].append(current_box)
-                    placed = True
-                    break
-                current_bin_index += 1
+        with Algorithms.__phase(stats, "alternate"):
+            for done, current_box in enumerate(boxes[packed:], packed + 1):
+                placed = False
+                rotate = allow_rotation and current_box.h > current_box.w
+                while current_bin_index < len(bins):
+                    if bins[current_bin_index].place(current_box, direction=direction, rotate=rotate):
+                        placed = True
+                        break
+                    current_bin_index += 1
+
+                if not placed:
+                    current_bin_index = len(bins)
+                    new_bin = PackingBin(bin_size, stats)
+                    bins.append(new_bin)
+                    new_bin.place(current_box, direction=direction, rotate=rotate)
 
-            if not placed:
-                current_bin_index = len(bins)
-                new_bin = []
-                bins.append(new_bin)
-                find_position(new_bin, current_box, direction=direction)
-                new_bin.append(current_box)
+                direction = 'right_to_left' if direction == 'left_to_right' else 'left_to_right'
+                if progress:
+                    progress(done, len(boxes))
 
-            direction = 'right_to_left' if direction == 'left_to_right' else 'left_to_right'
+        if stats:
+            stats.count("bins_opened", len(bins))
+        return [bin.boxes for bin in bins]
 
-        return bins
 
+    @staticmethod
+    def MRBSSF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''MaxRects Best Short Side Fit'''
+        return Algorithms.__first_fit_bins(bin_size, lambda: MaxRectsBin(bin_size, "short_side", stats),
+                                           boxes, progress, stats, allow_rotation)
+
+    @staticmethod
+    def MRBAF(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''MaxRects Best Area Fit'''
+        return Algorithms.__first_fit_bins(bin_size, lambda: MaxRectsBin(bin_size, "area", stats),
+                                           boxes, progress, stats, allow_rotation)
+
+    @staticmethod
+    def MRBL(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''MaxRects Bottom-left'''
+        return Algorithms.__first_fit_bins(bin_size, lambda: MaxRectsBin(bin_size, "bottom_left", stats),
+                                           boxes, progress, stats, allow_rotation)
+
+    @staticmethod
+    def MRCP(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''MaxRects Contact Point'''
+        return Algorithms.__first_fit_bins(bin_size, lambda: MaxRectsBin(bin_size, "contact", stats),
+                                           boxes, progress, stats, allow_rotation)
+
+    @staticmethod
+    def SKBL(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''Skyline Bottom-left'''
+        return Algorithms.__first_fit_bins(bin_size, lambda: SkylineBin(bin_size, "bottom_left", stats),
+                                           boxes, progress, stats, allow_rotation)
+
+    @staticmethod
+    def SKMW(bin_size: tuple, boxes: list[Box], progress=None, stats=None, allow_rotation=False) -> list[list[Box]]:
+        '''Skyline Min Waste'''
+        return Algorithms.__first_fit_bins(bin_size, lambda: SkylineBin(bin_size, "min_waste", stats),
+                                           boxes, progress, stats, allow_rotation)
 
     # ######################################################
     # ############# PRIVATE HELPER FUNCTIONS ###############
     # ######################################################
     @staticmethod
-    def __FFDH(boxes: list[Box], bin_width) -> list[list[Box]]:
+    def __first_fit_bins(bin_size: tuple, new_bin, boxes: list[Box], progress=None, stats=None, rotate=False) -> list[list[Box]]:
+        '''
+        Packs the boxes sorted by decreasing area into the first bin they fit\\
+        `new_bin()` returns an empty MaxRectsBin or SkylineBin, which chooses the position
+        '''
+        boxes.sort(key=lambda box: (box.w * box.h, box.h), reverse=True)
+
+        bins: list = []
+        space = SpaceIndex(bin_size)  # Bins without a free rectangle for the box are skipped without a search
+        starts = {}
+        with Algorithms.__phase(stats, "packing"):
+            for done, box in enumerate(boxes, 1):
+                if Algorithms.__first_bin(bins, space, box, starts, rotate=rotate) is None:
+                    bin = new_bin()
+                    if bin.place(box, rotate=rotate):
+                        bins.append(bin)
+                        space.append(bin.free_space)
+                if progress:
+                    progress(done, len(boxes))
+        if stats:
+            stats.count("bins_opened", len(bins))
+        return [bin.boxes for bin in bins]
+
+    @staticmethod
+    def __first_bin(bins: list, space: SpaceIndex, box: Box, starts: dict, rotate=False, **options):
+        '''
+        Places the box into the first bin it fits and returns the index of the bin or None\\
+        `space` keeps `free_space` of the bins, only the bins with enough of it are searched
+        and it is updated on success. Bins only get fuller, so `starts` keeps the first bin
+        that may still fit each box size. `options` are passed to `place` of the bin
+        '''
+        size = (box.w, box.h)
+        i = space.first_fit(box.w, box.h, starts.get(size, 0), rotate)
+        while i is not None:
+            if bins[i].place(box, rotate=rotate, **options):
+                space[i] = bins[i].free_space
+                starts[size] = i
+                return i
+            i = space.first_fit(box.w, box.h, i + 1, rotate)
+        starts[size] = len(bins)
+        return None
+
+    @staticmethod
+    def __FFDH(boxes: list[Box], bin_width, progress=None, rotate=False) -> list[list[Box]]:
         boxes.sort(key=lambda box: box.h, reverse=True)  # Sort boxes by height in decreasing order
 
         strips: list[list[Box]] = []
-
-        for box in boxes:
-            placed = False
-            for strip in strips:
-                if placed:
-                    break
-                available_strip_space = bin_width
-                for placed_box in strip:
-                    available_strip_space -= placed_box.w
-                if available_strip_space >= box.w: # Check if the box fits into the strip
-                    strip.append(box)
-                    placed = True
-            if not placed: # Create new strip
+        strip_heights = []  # Negated heights of the strips, increasing
+        strip_left_space = FirstFitIndex()
+
+        for done, box in enumerate(boxes, 1):
+            i = strip_left_space.first_fit(box.w) # First strip the box fits into
+            if i is None and rotate:
+                i = Algorithms.__stand_up(box, strip_heights, strip_left_space)
+            if i is not None:
+                strips[i].append(box)
+                strip_left_space[i] -= box.w
+            else: # Create new strip
                 strips.append([box])
+                strip_heights.append(-box.h)
+                strip_left_space.append(bin_width - box.w)
+            if progress:
+                progress(done, len(boxes))
 
         return strips
 
     @staticmethod
     def __FFD(strips: list[list[Box]], bin_height):
         bins: list[list[list[Box]]] = []
+        bin_left_space = FirstFitIndex()
 
         for strip in strips:
-            placed = False
-            for bin in bins:
-                if placed:
-                    break
-                available_bin_space = bin_height
-                for placed_strip in bin:
-                    available_bin_space -= placed_strip[0].h
-                if available_bin_space >= strip[0].h:
-                    bin.append(strip)
-                    placed = True
-            if not placed: # Create new bin
+            i = bin_left_space.first_fit(strip[0].h) # First bin the strip fits into
+            if i is not None:
+                bins[i].append(strip)
+                bin_left_space[i] -= strip[0].h
+            else: # Create new bin
                 bins.append([strip])
-        bins = [bin for bin in bins if bin]
+                bin_left_space.append(bin_height - strip[0].h)
         return bins
 
 
     @staticmethod
-    def __NFDH(boxes: list[Box], bin_width) -> list[list[Box]]:
+    def __NFDH(boxes: list[Box], bin_width, progress=None, rotate=False) -> list[list[Box]]:
         boxes.sort(key=lambda box: box.h, reverse=True)  # Sort boxes by height in decreasing order
 
         strips: list[list[Box]] = [[]]
+        available_strip_space = bin_width
 
-        i = 0
-        for box in boxes:
-            available_strip_space = bin_width
-            for placed_box in strips[i]:
-                available_strip_space -= placed_box.w
+        for done, box in enumerate(boxes, 1):
+            if (rotate and strips[-1] and box.h < box.w <= strips[-1][0].h
+                    and box.h <= available_strip_space < box.w):
+                box.w, box.h = box.h, box.w # Stand the box up to stay in the strip
             if available_strip_space >= box.w: # Check if the box fits into the strip
-                strips[i].append(box)
+                strips[-1].append(box)
+                available_strip_space -= box.w
             else: # Create new strip
                 strips.append([box])
-                i += 1
+                available_strip_space = bin_width - box.w
+            if progress:
+                progress(done, len(boxes))
 
         return strips
 
     @staticmethod
     def __NFD(strips: list[list[Box]], bin_height):
         bins: list[list[list[Box]]] = [[]]
+        available_bin_space = bin_height
 
-        i = 0
         for strip in strips:
-            available_bin_space = bin_height
-            for placed_strip in bins[i]:
-                available_bin_space -= placed_strip[0].h
             if available_bin_space >= strip[0].h:
-                bins[i].append(strip)
+                bins[-1].append(strip)
+                available_bin_space -= strip[0].h
             else:
                 bins.append([strip])
-                i += 1
+                available_bin_space = bin_height - strip[0].h
         bins = [bin for bin in bins if bin]
         return bins
     
 
     @staticmethod
-    def __BFDH(boxes: list[Box], bin_width) -> list[list[Box]]:
+    def __BFDH(boxes: list[Box], bin_width, progress=None, rotate=False) -> list[list[Box]]:
         # Sort boxes by height in decreasing order
         boxes.sort(key=lambda box: box.h, reverse=True)
 
         strips: list[list[Box]] = []
-        strip_left_space = []
+        strip_left_space = BestFitIndex()
+        # Standing boxes up needs the strips in opening order, only kept with rotate
+        strip_heights = []
+        strip_first_space = FirstFitIndex()
 
-        for box in boxes:
-            best_strip_index = None
-            min_space_left = float('inf')
-
-            for i, space in enumerate(strip_left_space):
-                # Check if this bin has the least space left that can ffit the strip
-                if space >= box.w and space < min_space_left:
-                    min_space_left = space
-                    best_strip_index = i
+        for done, box in enumerate(boxes, 1):
+            # Strip with the least space left that can fit the box
+            best_strip_index = strip_left_space.best_fit(box.w)
+            if best_strip_index is None and rotate:
+                best_strip_index = Algorithms.__stand_up(box, strip_heights, strip_first_space)
 
             if best_strip_index is not None:
-                # Place the strip in the bin with the smallest space left
+                # Place the box in the strip with the smallest space left
                 strips[best_strip_index].append(box)
                 strip_left_space[best_strip_index] -= box.w
+                if rotate:
+                    strip_first_space[best_strip_index] -= box.w
             else:
                 # Create a new strip
                 new_strip = [box]
                 strips.append(new_strip)
                 strip_left_space.append(bin_width - box.w)
+                if rotate:
+                    strip_heights.append(-box.h)
+                    strip_first_space.append(bin_width - box.w)
+            if progress:
+                progress(done, len(boxes))
 
         return strips
 
@@ -326,17 +525,12 @@ class Algorithms:
     def __BFD(strips: list[list[Box]], bin_height):
         bins: list[list[list[Box]]] = [[]]
 
-        bin_left_space = [bin_height]
+        bin_left_space = BestFitIndex()
+        bin_left_space.append(bin_height)
 
         for strip in strips:
-            best_bin_index = None
-            min_space_left = float('inf')
-
-            for i, space in enumerate(bin_left_space):
-                # Check if this bin has the least space left that can ffit the strip
-                if space >= strip[0].h and space < min_space_left:
-                    min_space_left = space
-                    best_bin_index = i
+            # Bin with the least space left that can fit the strip
+            best_bin_index = bin_left_space.best_fit(strip[0].h)
 
             if best_bin_index is not None:
                 # Place the strip in the bin with the smallest space left
@@ -353,6 +547,107 @@ class Algorithms:
 
         return bins
 
+    @staticmethod
+    def __FCDH(boxes: list[Box], bin_width, progress=None) -> list[list[Box]]:
+        '''
+        Floor-ceiling strip packing, boxes get positions relative to their strip\\
+        Every box goes by best fit to the floor or open ceiling with the least width
+        left, ceilings win ties, or else on a new shelf. The ceiling of a shelf opens
+        only when a box no longer fits on its floor
+        '''
+        boxes.sort(key=lambda box: box.h, reverse=True)  # Sort boxes by height in decreasing order
+
+        shelves: list[FloorCeilingShelf] = []
+        floor_space = BestFitIndex()
+        ceiling_space = BestFitIndex()  # 0 while the ceiling is closed
+        ceiling_open: list[bool] = []
+        closed = []         # Heap of (floor space, shelf index) of closed ceilings, may hold stale ones
+        # The space of a shelf grows when boxes get low enough to pass its boxes
+        changes = []        # Heap of (-box height, shelf index)
+        next_changes = []   # Current change height of each shelf
+
+        def refresh(i, h):
+            floor, ceiling, change = shelves[i].spaces(h)
+            if floor_space[i] != floor:
+                floor_space[i] = floor
+                if not ceiling_open[i]:
+                    heappush(closed, (floor, i))
+            if ceiling_open[i] and ceiling_space[i] != ceiling:
+                ceiling_space[i] = ceiling
+            if change != next_changes[i]:
+                next_changes[i] = change
+                if change is not None:
+                    heappush(changes, (-change, i))
+
+        for done, box in enumerate(boxes, 1):
+            while changes and -changes[0][0] >= box.h:
+                change, i = heappop(changes)
+                if next_changes[i] == -change: # Skip changes replaced by newer ones
+                    next_changes[i] = None
+                    refresh(i, box.h)
+
+            # Ceilings of the shelves whose floor can no longer hold the box open
+            while closed and closed[0][0] < box.w:
+                space, i = heappop(closed)
+                if not ceiling_open[i] and floor_space[i] == space:
+                    ceiling_open[i] = True
+                    refresh(i, box.h)
+            ceiling = ceiling_space.best_fit(box.w)
+            floor = floor_space.best_fit(box.w)
+            # The tighter of the two wins
+            if ceiling is not None and floor is not None and floor_space[floor] < ceiling_space[ceiling]:
+                ceiling = None
+            if ceiling is not None:
+                shelves[ceiling].place_ceiling(box)
+                refresh(ceiling, box.h)
+            elif floor is not None:
+                shelves[floor].place_floor(box)
+                refresh(floor, box.h)
+            else:
+                shelf = FloorCeilingShelf(bin_width, box.h)
+                shelf.place_floor(box)
+                shelves.append(shelf)
+                floor_space.append(bin_width - box.w)
+                ceiling_space.append(0)
+                ceiling_open.append(False)
+                next_changes.append(None)
+                heappush(closed, (bin_width - box.w, len(shelves) - 1))
+            if progress:
+                progress(done, len(boxes))
+
+        return [shelf.boxes for shelf in shelves]
+
+    @staticmethod
+    def __turn_oversized(boxes: list[Box], bin_size: tuple) -> None:
+        '''Turns the boxes which only fit the bin on their side'''
+        bin_width, bin_height = bin_size
+        for box in boxes:
+            if (box.w > bin_width or box.h > bin_height) and box.h <= bin_width and box.w <= bin_height:
+                box.w, box.h = box.h, box.w
+
+    @staticmethod
+    def __stand_up(box: Box, shelf_heights: list, shelf_space: FirstFitIndex):
+        '''
+        Returns the first shelf which holds the box standing up or None\\
+        Only lying boxes are stood up and the box is turned when a shelf is found
+        ### Arguments
+        - `shelf_heights` - negated heights of the shelves, increasing as shelves open from the highest
+        - `shelf_space` - width left on each shelf
+        '''
+        if box.w <= box.h:
+            return None
+        tall_enough = bisect_right(shelf_heights, -box.w)   # Shelves at least box.w high come first
+        i = shelf_space.first_fit(box.h)
+        if i is None or i >= tall_enough:
+            return None
+        box.w, box.h = box.h, box.w
+        return i
+
+    @staticmethod
+    def __phase(stats, name):
+        '''Times the phase when stats are collected'''
+        return stats.phase(name) if stats else nullcontext()
+
     @staticmethod
     def __unstrip_bins(bins_with_strips: list[list[list[Box]]]) -> list[list[Box]]:
         '''Sets the positions of the boxes in each bin'''
@@ -369,4 +664,19 @@ class Algorithms:
                     x += bin.w
                 y += strip[0].h
         
-        return bins
\ No newline at end of file
+        return bins
+
+    @staticmethod
+    def __stack_strips(bins_with_strips: list[list[list[Box]]]) -> list[list[Box]]:
+        '''Moves the boxes placed inside their strips to the positions of the strips in each bin'''
+        bins: list[list[Box]] = [[] for _ in bins_with_strips]
+
+        for src_bin, dst_bin in zip(bins_with_strips, bins):
+            y = 0
+            for strip in src_bin:
+                for box in strip:
+                    box.y += y
+                    dst_bin.append(box)
+                y += strip[0].h
+
+        return bins
@@ -0,0 +1,192 @@
+'''
+Benchmark of the algorithms over seeded instance families
+
+    python -m bench --sizes 100,1000,10000 --out bench.json --csv bench.csv
+    python -m bench --baseline bench.json --threshold 0.2
+
+Every algorithm runs on every family, bin size and number of boxes.
+Time is the best of `--repeat` runs measured with perf_counter_ns, peak
+memory is measured in a separate run under tracemalloc. With `--baseline`
+the results are compared to a stored run and slowdowns bigger than the
+threshold make the command exit with status 1. `--not-worse FC:HBF` also
+exits with status 1 when FC uses more bins than HBF on any instance.
+
+    python -m bench --families class1,class2,class3,class4,class5,class6,class7,class8,class9,class10 \\
+        --algo FC,HBF --no-memory --not-worse FC:HBF
+
+`--scales 1,1000` packs every instance again in a bin 1000 times bigger with
+boxes 1000 times bigger, the time of an algorithm should not grow with it.
+
+    python -m bench --families uniform --bins 100x100 --sizes 300 --algo FBL,NBL,AD --scales 1,1000,10000
+'''
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+
+from helpers import Box, Placement, ValidationError
+from algorithms import Algorithms
+from generators import generate
+
+FIELDS = ["family", "bin_w", "bin_h", "n", "algorithm", "time_ns", "peak_bytes", "bins", "fill"]
+
+def run_case(algorithm_name: str, bin_size: tuple, boxes: list, repeat=1, memory=True) -> dict:
+    '''Runs a single algorithm on a single instance and returns its measurements'''
+    algorithm = getattr(Algorithms, algorithm_name)
+    best_time = None
+    for _ in range(repeat):
+        placements = [Placement(box) for box in boxes]
+        start_time = time.perf_counter_ns()
+        bins = algorithm(bin_size, placements)
+        elapsed_time = time.perf_counter_ns() - start_time
+        best_time = elapsed_time if best_time is None else min(best_time, elapsed_time)
+
+    peak = None
+    if memory:
+        placements = [Placement(box) for box in boxes]
+        tracemalloc.start()
+        algorithm(bin_size, placements)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    boxes_area = sum(box.w * box.h for box in boxes)
+    return {
+        "algorithm": algorithm_name,
+        "time_ns": best_time,
+        "peak_bytes": peak,
+        "bins": len(bins),
+        "fill": boxes_area / (bin_size[0] * bin_size[1] * len(bins)) if bins else 0.0,
+    }
+
+def run_benchmark(families: list[str], bin_sizes: list[tuple], sizes: list[int], algorithm_names: list[str],
+                  seed=0, repeat=1, memory=True, time_limit=None, log=None, scales=(1,)) -> list[dict]:
+    '''
+    Runs every algorithm over the instance families at growing number of boxes\\
+    Once an algorithm takes longer than `time_limit` seconds, bigger instances
+    of the same family and bin size are skipped for it. Each of the `scales`
+    multiplies the sizes of the bin and the boxes, the packing stays the same,
+    so the times show how much an algorithm depends on the size of the bin
+    '''
+    results = []
+    for family in families:
+        # The classes define their own bin size
+        family_bins = [None] if family.startswith("class") else bin_sizes
+        for bin_size, scale in ((bin_size, scale) for bin_size in family_bins for scale in scales):
+            too_slow = set()
+            for n in sorted(sizes):
+                instance_bin, box_array = generate(family, n, bin_size, seed=seed)
+                boxes = box_array.to_boxes()
+                if scale != 1:
+                    instance_bin = (instance_bin[0] * scale, instance_bin[1] * scale)
+                    boxes = [Box((box.w * scale, box.h * scale)) for box in boxes]
+                for algorithm_name in algorithm_names:
+                    if algorithm_name in too_slow:
+                        continue
+                    record = {"family": family, "bin_w": instance_bin[0], "bin_h": instance_bin[1], "n": n}
+                    record.update(run_case(algorithm_name, instance_bin, boxes, repeat, memory))
+                    results.append(record)
+                    if log:
+                        log(record)
+                    if time_limit is not None and record["time_ns"] > time_limit * 1e9:
+                        too_slow.add(algorithm_name)
+    return results
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    '''Returns the results slower than the baseline by more than the threshold ratio'''
+    key = lambda r: (r["family"], r["bin_w"], r["bin_h"], r["n"], r["algorithm"])
+    stored = {key(r): r for r in baseline}
+    regressions = []
+    for record in results:
+        old = stored.get(key(record))
+        if old and old["time_ns"] and record["time_ns"] > old["time_ns"] * (1 + threshold):
+            regressions.append(dict(record, baseline_time_ns=old["time_ns"],
+                                    slowdown=record["time_ns"] / old["time_ns"]))
+    return regressions
+
+def more_bins(results: list[dict], pairs: list[tuple]) -> list[dict]:
+    '''Returns the cases where the first algorithm of a pair uses more bins than the second one'''
+    key = lambda r: (r["family"], r["bin_w"], r["bin_h"], r["n"])
+    bins = {key(r) + (r["algorithm"],): r["bins"] for r in results}
+    worse = []
+    for record in results:
+        for algorithm_name, reference in pairs:
+            reference_bins = bins.get(key(record) + (reference,))
+            if record["algorithm"] == algorithm_name and reference_bins is not None and record["bins"] > reference_bins:
+                worse.append(dict(record, reference=reference, reference_bins=reference_bins))
+    return worse
+
+def parse_bin(text: str) -> tuple:
+    w, _, h = text.partition("x")
+    if not (w.isdigit() and h.isdigit()) or int(w) <= 0 or int(h) <= 0:
+        raise ValidationError(f"Error while parsing bin size: {text}", "bin_size_parsing")
+    return int(w), int(h)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="bench", description="Benchmark of the bin packing algorithms")
+    parser.add_argument("--families", default="uniform,real_world,class5,class7",
+                        help="comma separated generator names: uniform, real_world, class1 to class10")
+    parser.add_argument("--bins", default="100x100,1000x1000", help="comma separated bin sizes for non-class families")
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated numbers of boxes")
+    parser.add_argument("--scales", default="1",
+                        help="comma separated factors for the sizes of the bin and the boxes, the packing stays the same")
+    parser.add_argument("--algo", default=",".join(Algorithms.get_implemented_names()),
+                        help="comma separated algorithm names (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the instances")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per case, the best one is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory run")
+    parser.add_argument("--time-limit", type=float, default=60.0,
+                        help="seconds after which bigger instances are skipped for an algorithm")
+    parser.add_argument("--out", help="JSON file for the results")
+    parser.add_argument("--csv", help="CSV file for the results")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown ratio, 0.2 means 20%%")
+    parser.add_argument("--not-worse", default="",
+                        help="comma separated A:B pairs, A must not use more bins than B on any instance")
+    args = parser.parse_args(argv)
+
+    algorithm_names = [name for name in args.algo.split(",") if name]
+    pairs = [tuple(pair.partition(":")[::2]) for pair in args.not_worse.split(",") if pair]
+    for name in algorithm_names + [name for pair in pairs for name in pair]:
+        if name not in Algorithms.get_implemented_names():
+            print(f"Unknown algorithm: {name}", file=sys.stderr)
+            return 2
+
+    def log(record):
+        peak = f"{record['peak_bytes'] / 2**20:.1f} MiB" if record["peak_bytes"] is not None else "-"
+        print(f"{record['family']:>10} {record['bin_w']}x{record['bin_h']:<6} n={record['n']:<8} "
+              f"{record['algorithm']:<4} {record['time_ns'] / 1e6:10.2f} ms {peak:>10} "
+              f"{record['bins']:>6} bins {record['fill']:.2%}")
+
+    results = run_benchmark(args.families.split(","), [parse_bin(b) for b in args.bins.split(",")],
+                            [int(n) for n in args.sizes.split(",")], algorithm_names, args.seed,
+                            args.repeat, not args.no_memory, args.time_limit, log,
+                            [int(scale) for scale in args.scales.split(",")])
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for r in regressions:
+            print(f"SLOWER {r['family']} {r['bin_w']}x{r['bin_h']} n={r['n']} {r['algorithm']}: "
+                  f"{r['baseline_time_ns'] / 1e6:.2f} ms -> {r['time_ns'] / 1e6:.2f} ms ({r['slowdown']:.2f}x)")
+        if regressions:
+            status = 1
+    for r in more_bins(results, pairs):
+        print(f"MORE BINS {r['family']} {r['bin_w']}x{r['bin_h']} n={r['n']} {r['algorithm']}: "
+              f"{r['bins']} bins, {r['reference']} {r['reference_bins']} bins")
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
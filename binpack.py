@@ -0,0 +1,148 @@
+'''
+Headless command line interface of the solver
+
+    python -m binpack solve --bin 1200x800 --algo HBF,HFF --input boxes.txt --out result.json
+
+`--input` can be a single instance file, a directory or a glob pattern.
+With many instances `--out` is a directory which gets one JSON file per
+instance and the instances are solved in parallel by a pool of workers.
+`--replay` is a directory which gets a result file of every packing, see
+resultfile, the GUI opens them with their placement order.
+'''
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers import BoxStackingSolver, SolveResult, SolveStats, ValidationError
+from algorithms import Algorithms
+from cache import ResultCache
+from resultfile import write_result
+
+def solve_instance(path: str, bin_text: str, algorithm_names: list[str], with_stats=False, allow_rotation=False,
+                   cache_dir=None, improve_time=None, replay_dir=None) -> dict:
+    '''
+    Solves a single instance file with every algorithm, then with `improve` for improve_time seconds if given\\
+    With replay_dir every packing is also written there as `<instance>.<algorithm>.bpr`\\
+    Returns the JSON ready result, errors are reported in the `error` field
+    '''
+    report = {"instance": path, "bin_size": None, "boxes": 0, "lower_bound": None, "results": []}
+    try:
+        bss = BoxStackingSolver(ResultCache(directory=cache_dir) if cache_dir else None)
+        bss.update_bin_size(bin_text)
+        bss.update_boxes_from_file(path, allow_rotation)
+        report["bin_size"] = list(bss.bin_size)
+        report["boxes"] = len(bss.boxes)
+        report["lower_bound"] = bss.lower_bound(allow_rotation)
+
+        index = {id(box): i for i, box in enumerate(bss.boxes)}
+        for algorithm_name in algorithm_names + (["improve"] if improve_time else []):
+            stats = SolveStats() if with_stats else None
+            order = []
+            start_time = time.perf_counter()
+            if algorithm_name == "improve":
+                bins = bss.improve(improve_time, stats=stats, allow_rotation=allow_rotation, order=order)
+            else:
+                bins = bss.solve(getattr(Algorithms, algorithm_name), stats=stats, allow_rotation=allow_rotation,
+                                 order=order)
+            result = SolveResult(algorithm_name, bins, bss.bin_size, time.perf_counter() - start_time, stats,
+                                 report["lower_bound"], order)
+            if replay_dir:
+                name = os.path.splitext(os.path.basename(path))[0]
+                write_result(os.path.join(replay_dir, f"{name}.{algorithm_name}.bpr"), bss.bin_size, result, bss.boxes)
+            report["results"].append({
+                "algorithm": result.name,
+                "bins": result.bin_count,
+                "fill": round(result.fill * 100, 4),
+                "gap": round(result.gap * 100, 4) if result.gap is not None else None,
+                "time": result.time,
+                # One [box index, bin, x, y, w, h] row for every box
+                "placements": [[index[id(p.box)], bin_id, p.x, p.y, p.w, p.h]
+                               for bin_id, bin in enumerate(result.bins) for p in bin],
+            })
+            if stats:
+                report["results"][-1]["stats"] = {"phases": stats.phases, "counters": stats.counters}
+    except OSError as err:
+        report["error"] = str(err)
+    except ValidationError as err:
+        report["error"] = str(err)
+        report["invalid_lines"] = [str(e) for e in err.errors]
+    return report
+
+def find_instances(pattern: str) -> list[str]:
+    '''Returns instance files for a file, a directory or a glob pattern'''
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+def solve_command(args) -> int:
+    algorithm_names = [name.strip() for name in args.algo.split(",") if name.strip()]
+    for name in algorithm_names:
+        if name not in Algorithms.get_implemented_names():
+            print(f"Unknown algorithm: {name}", file=sys.stderr)
+            return 2
+
+    paths = find_instances(args.input)
+    if not paths:
+        print(f"No instance files found: {args.input}", file=sys.stderr)
+        return 2
+    many = len(paths) > 1 or os.path.isdir(args.input) or glob.has_magic(args.input)
+    if many and args.out:
+        os.makedirs(args.out, exist_ok=True)
+    if args.replay:
+        os.makedirs(args.replay, exist_ok=True)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        jobs = executor.map(solve_instance, paths, [args.bin] * len(paths), [algorithm_names] * len(paths),
+                            [args.stats] * len(paths), [args.rotate] * len(paths),
+                            [args.cache] * len(paths), [args.improve] * len(paths), [args.replay] * len(paths),
+                            chunksize=max(1, len(paths) // (4 * (args.workers or os.cpu_count() or 1))))
+        for report in jobs:
+            if "error" in report:
+                failed += 1
+                print(f"{report['instance']}: error: {report['error']}", file=sys.stderr)
+            else:
+                summary = ", ".join(f"{r['algorithm']} {r['bins']} bins {r['fill']:.2f}% {r['time']:.4f}s"
+                                    for r in report["results"])
+                print(f"{report['instance']}: lower bound {report['lower_bound']}, {summary}")
+
+            if args.out:
+                out_path = args.out
+                if many:
+                    name = os.path.splitext(os.path.basename(report["instance"]))[0]
+                    out_path = os.path.join(args.out, name + ".json")
+                with open(out_path, "w") as file:
+                    json.dump(report, file)
+    return 1 if failed else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="binpack", description="2D Bin Packing Solver")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve = commands.add_parser("solve", help="solve instance files with the chosen algorithms")
+    solve.add_argument("--bin", required=True, help="bin size as WxH, for example 1200x800")
+    solve.add_argument("--algo", default=",".join(Algorithms.get_implemented_names()),
+                       help="comma separated algorithm names (default: all)")
+    solve.add_argument("--input", required=True, help="instance file, directory or glob with WxH lines")
+    solve.add_argument("--out", help="JSON file, or a directory when solving many instances")
+    solve.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    solve.add_argument("--stats", action="store_true", help="add phase timings and counters to the results")
+    solve.add_argument("--rotate", action="store_true", help="allow turning the boxes by 90 degrees")
+    solve.add_argument("--cache", help="directory of the result cache, solved instances are not solved again")
+    solve.add_argument("--improve", type=float, default=None, metavar="SECONDS",
+                       help="also search for a better packing for this many seconds")
+    solve.add_argument("--replay", metavar="DIR", help="directory for a result file with the placement order "
+                                                        "of every packing")
+    solve.set_defaults(handler=solve_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
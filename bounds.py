@@ -0,0 +1,190 @@
+'''
+Lower bounds on the number of bins of a 2D bin packing instance
+
+    bound = lower_bound(bin_size, boxes)
+    gap = bin_count / bound - 1
+
+Every bound takes the box sizes as NumPy arrays and only sorts, counts and
+sums them, so all of them together cost O(n log n):
+- `area_bound` - area of the boxes over the bin area, as `L` of `Algorithms.AD`
+- `l1_bound` - Martello and Vigo L1, the 1D bound of Martello and Toth for the
+boxes wider or taller than half of the bin
+- `l2_bound` - Martello and Vigo L2, boxes bigger than half of the bin in both
+sizes need their own bins, the area of the small boxes fills the rest
+- `dff_bound` - area bound of the boxes scaled by the dual feasible functions
+of Fekete and Schepers, an L3-style bound
+
+With rotation only the area bound and the dual feasible function bound hold,
+each box is counted in the orientation giving the smaller bound.
+'''
+import math
+import numpy as np
+
+# Number of the (p, q) thresholds of l2_bound and of the thresholds of dff_bound tested in each size
+L2_THRESHOLDS = 256
+DFF_THRESHOLDS = 16
+DFF_ORDERS = (1, 2, 3, 4, 5)
+# Boxes scaled by the dual feasible functions at once
+CHUNK_SIZE = 1 << 16
+
+def box_sizes(boxes) -> tuple:
+    '''Returns the `(widths, heights)` int64 arrays of a list of boxes or placements or of a BoxArray'''
+    if hasattr(boxes, "w") and hasattr(boxes, "h") and not isinstance(boxes, list):
+        return np.asarray(boxes.w, dtype=np.int64), np.asarray(boxes.h, dtype=np.int64)
+    # Placements keep the size of the box they were made for in .box
+    boxes = [getattr(box, "box", box) for box in boxes]
+    w = np.fromiter((box.w for box in boxes), dtype=np.int64, count=len(boxes))
+    h = np.fromiter((box.h for box in boxes), dtype=np.int64, count=len(boxes))
+    return w, h
+
+def lower_bound(bin_size: tuple, boxes, allow_rotation=False) -> int:
+    '''
+    Returns the best of the lower bounds for the boxes
+    ### Arguments
+    - `bin_size` - `(width, height)` of the bins
+    - `boxes` - list of boxes or placements or a BoxArray
+    - `allow_rotation` - boxes may be turned by 90 degrees
+    '''
+    w, h = box_sizes(boxes)
+    if not len(w):
+        return 0
+    if allow_rotation:
+        return max(area_bound(bin_size, w, h), dff_bound(bin_size, w, h, allow_rotation=True))
+    return max(area_bound(bin_size, w, h), l1_bound(bin_size, w, h), l2_bound(bin_size, w, h),
+               dff_bound(bin_size, w, h))
+
+def area_bound(bin_size: tuple, w, h) -> int:
+    '''Returns the number of bins the area of the boxes needs'''
+    return math.ceil(int(np.dot(w, h)) / (bin_size[0] * bin_size[1]))
+
+def l1_bound(bin_size: tuple, w, h) -> int:
+    '''
+    Returns the Martello and Vigo L1 bound\\
+    Boxes wider than half of the bin cannot be put side by side, so their
+    heights are a 1D bin packing instance, and the same for the tall boxes
+    '''
+    bin_width, bin_height = bin_size
+    return max(_bound_1d(h[2 * w > bin_width], bin_height), _bound_1d(w[2 * h > bin_height], bin_width))
+
+def _bound_1d(sizes, capacity) -> int:
+    '''
+    Returns the Martello and Toth L2 bound of the 1D instance, the best over every threshold a:
+    - `J1` - sizes bigger than capacity - a, no other size fits next to them
+    - `J2` - the other sizes bigger than half of the capacity, one in each bin
+    - `J3` - sizes between a and half of the capacity, they only fit into the space J2 left and into new bins
+    '''
+    if not len(sizes):
+        return 0
+    sizes = np.sort(sizes)
+    sums = np.concatenate(([0], np.cumsum(sizes)))
+    half = np.searchsorted(sizes, capacity // 2, 'right')   # Sizes up to half of the capacity
+    big = len(sizes) - half
+
+    thresholds = np.concatenate(([0], np.unique(sizes[:half])))
+    first_j1 = np.searchsorted(sizes, capacity - thresholds, 'right')
+    j2_count = first_j1 - half
+    j2_sum = sums[first_j1] - sums[half]
+    j3_sum = sums[half] - sums[np.searchsorted(sizes, thresholds, 'left')]
+    overflow = j3_sum - (j2_count * capacity - j2_sum)
+    return int(big + np.maximum(0, -(-overflow // capacity)).max())
+
+def l2_bound(bin_size: tuple, w, h, thresholds=L2_THRESHOLDS) -> int:
+    '''
+    Returns the Martello and Vigo L2 bound, the best over the (p, q) thresholds:
+    - `I1` - boxes wider than W - p and taller than H - q, no box of I3 fits next to them
+    - `I2` - the other boxes bigger than half of the bin in both sizes, one in each bin
+    - `I3` - boxes between p and W / 2 wide and between q and H / 2 tall,
+    they only fit into the space I2 left and into new bins
+
+    At most `thresholds` values of p and q are tested, the bound holds for any of them
+    '''
+    bin_width, bin_height = bin_size
+    big = (2 * w > bin_width) & (2 * h > bin_height)
+    small = (2 * w <= bin_width) & (2 * h <= bin_height)
+    big_count = int(big.sum())
+    if not small.any():
+        return big_count
+    big_w, big_h = w[big], h[big]
+    small_w, small_h = w[small], h[small]
+    p = _thresholds(small_w, thresholds)
+    q = _thresholds(small_h, thresholds)
+    shape = (len(p) + 1, len(q) + 1)
+
+    # Box of I1 for the thresholds from (p_i, q_j) up, a dominance count over the grid
+    i1 = np.searchsorted(p, bin_width - big_w + 1, 'left')
+    j1 = np.searchsorted(q, bin_height - big_h + 1, 'left')
+    i1_count = _grid(i1, j1, None, shape).cumsum(0).cumsum(1)[:-1, :-1]
+    i1_area = _grid(i1, j1, big_w * big_h, shape).cumsum(0).cumsum(1)[:-1, :-1]
+
+    # Box of I3 for the thresholds up to (p_i, q_j)
+    i3 = np.searchsorted(p, small_w, 'right') - 1
+    j3 = np.searchsorted(q, small_h, 'right') - 1
+    i3_area = _grid(i3, j3, small_w * small_h, shape)[::-1, ::-1].cumsum(0).cumsum(1)[::-1, ::-1][:-1, :-1]
+
+    bin_area = bin_width * bin_height
+    i2_count = big_count - i1_count
+    i2_area = int(np.dot(big_w, big_h)) - i1_area
+    overflow = i2_area + i3_area - i2_count * bin_area
+    return int(big_count + np.maximum(0, -(-overflow // bin_area)).max())
+
+def _thresholds(sizes, count):
+    '''Returns 0 and at most count - 1 of the distinct sizes, spread over their range'''
+    values = np.unique(sizes)
+    if len(values) >= count:
+        values = values[np.linspace(0, len(values) - 1, count - 1).astype(np.int64)]
+    return np.unique(np.concatenate(([0], values)))
+
+def _grid(rows, cols, weights, shape):
+    '''Sums the weights of the boxes into the cells of the grid'''
+    cells = np.bincount(rows * shape[1] + cols, weights, minlength=shape[0] * shape[1])
+    # Sums of integer weights are exact below 2^53, well above any instance area
+    return np.rint(cells).astype(np.int64).reshape(shape)
+
+def dff_bound(bin_size: tuple, w, h, allow_rotation=False) -> int:
+    '''
+    Returns the best area bound of the boxes scaled by pairs of dual feasible functions\\
+    Every pair (f, g) gives a bound: the sum of f(w / W) * g(h / H) over the boxes
+    is at most the number of bins. The functions are the identity, u^(k) of the
+    orders `DFF_ORDERS` and U^(e) for `DFF_THRESHOLDS` thresholds e up to half of the bin
+    '''
+    bin_width, bin_height = bin_size
+    sizes = np.concatenate((w, h)) if allow_rotation else None
+    width_functions = _dff_functions(w if sizes is None else sizes, bin_width)
+    height_functions = _dff_functions(h if sizes is None else sizes, bin_height)
+    sums = np.zeros((len(width_functions), len(height_functions)))
+    pairs = [(i, j) for i in range(len(width_functions)) for j in range(len(height_functions))
+             if i == j or i == 0 or j == 0]
+    for start in range(0, len(w), CHUNK_SIZE):
+        cw, ch = w[start:start + CHUNK_SIZE], h[start:start + CHUNK_SIZE]
+        fw = np.stack([f(cw) for f in width_functions])
+        gh = np.stack([g(ch) for g in height_functions])
+        if not allow_rotation:
+            sums += fw @ gh.T
+            continue
+        # A turned box is counted with the sizes swapped, orientations not fitting the bin never count
+        fh = np.stack([f(ch) for f in width_functions])
+        gw = np.stack([g(cw) for g in height_functions])
+        # The minimum does not split into a product, so only the pairs with the identity
+        # or with the function of the same index are tested
+        upright = (cw <= bin_width) & (ch <= bin_height)
+        turned = (ch <= bin_width) & (cw <= bin_height)
+        for i, j in pairs:
+            sums[i, j] += np.minimum(np.where(upright, fw[i] * gh[j], np.inf),
+                                     np.where(turned, fh[i] * gw[j], np.inf)).sum()
+    # Scaled sizes are floats, so the sum is rounded down by a little more than its error
+    return max(0, math.ceil(sums.max() - 1e-9 * (len(w) + 1)))
+
+def _dff_functions(sizes, capacity):
+    '''Returns the dual feasible functions for the bins of the capacity, thresholds are taken from the sizes'''
+    functions = [lambda x: x / capacity]
+    for k in DFF_ORDERS:
+        # u^(k)(x) = x if (k + 1) x is an integer, floor((k + 1) x) / k otherwise
+        functions.append(lambda x, k=k: np.where((k + 1) * x % capacity == 0, x / capacity,
+                                                 ((k + 1) * x // capacity) / k))
+    candidates = np.unique(sizes[(sizes > 0) & (2 * sizes <= capacity)])
+    if len(candidates) > DFF_THRESHOLDS:
+        candidates = candidates[np.linspace(0, len(candidates) - 1, DFF_THRESHOLDS).astype(np.int64)]
+    for e in candidates.tolist():
+        # U^(e)(x) = 1 if x > 1 - e, x if e <= x <= 1 - e, 0 if x < e
+        functions.append(lambda x, e=e: np.where(x > capacity - e, 1.0, np.where(x < e, 0.0, x / capacity)))
+    return functions
@@ -0,0 +1,142 @@
+import numpy as np
+from helpers import Box, ValidationError
+
+class BoxArray:
+    '''
+    Columnar representation of a list of boxes\\
+    Every attribute of the boxes is kept in its own NumPy int32 array
+    ### Values
+    - `.w and .h` - sizes of the boxes
+    - `.x and .y` - positions of the boxes, -1 if the box is not positioned
+    - `.bin_id` - index of the bin holding the box, -1 if the box is not packed
+    '''
+    def __init__(self, w, h):
+        self.w = np.ascontiguousarray(w, dtype=np.int32)
+        self.h = np.ascontiguousarray(h, dtype=np.int32)
+        if self.w.shape != self.h.shape or self.w.ndim != 1:
+            raise ValidationError("Box widths and heights must be 1D arrays of equal length", "box_array")
+        if len(self.w) and (self.w.min() <= 0 or self.h.min() <= 0):
+            raise ValidationError("Box dimensions must be bigger than zero", "box_size")
+        self.x = np.full(len(self.w), -1, dtype=np.int32)
+        self.y = np.full(len(self.w), -1, dtype=np.int32)
+        self.bin_id = np.full(len(self.w), -1, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.w)
+
+    def __repr__(self):
+        return f"BoxArray({len(self)} boxes, {self.bin_count()} bins)"
+
+    @classmethod
+    def from_boxes(cls, boxes: list[Box]) -> 'BoxArray':
+        '''Creates the array from a list of boxes, positions are not copied'''
+        w = np.fromiter((box.w for box in boxes), dtype=np.int32, count=len(boxes))
+        h = np.fromiter((box.h for box in boxes), dtype=np.int32, count=len(boxes))
+        return cls(w, h)
+
+    def to_boxes(self) -> list[Box]:
+        '''Returns the list of boxes, in the same order as the array'''
+        boxes = []
+        for w, h, x, y in zip(self.w.tolist(), self.h.tolist(), self.x.tolist(), self.y.tolist()):
+            box = Box((w, h))
+            if x >= 0:
+                box.x, box.y = x, y
+            boxes.append(box)
+        return boxes
+
+    def to_bins(self) -> list[list[Box]]:
+        '''Returns packed boxes grouped by bins, each bin sorted from the bottom-left corner'''
+        packed = np.flatnonzero(self.bin_id >= 0)
+        order = packed[np.lexsort((self.x[packed], self.y[packed], self.bin_id[packed]))]
+        bins: list[list[Box]] = [[] for _ in range(self.bin_count())]
+        for i, w, h, x, y in zip(self.bin_id[order].tolist(), self.w[order].tolist(), self.h[order].tolist(),
+                                 self.x[order].tolist(), self.y[order].tolist()):
+            box = Box((w, h))
+            box.x, box.y = x, y
+            bins[i].append(box)
+        return bins
+
+    def bin_count(self) -> int:
+        '''Returns the number of the bins used'''
+        return int(self.bin_id.max()) + 1 if len(self) else 0
+
+
+def HNF(bin_size: tuple, boxes: BoxArray) -> BoxArray:
+    '''
+    Vectorized Hybrid Next-Fit\\
+    Gives the same packing as `Algorithms.HNF`, positions and bins
+    are written into the given array
+    '''
+    bin_width, bin_height = bin_size
+    if len(boxes) == 0:
+        return boxes
+
+    # Sort boxes by height in decreasing order, stable like list.sort
+    order = np.argsort(-boxes.h, kind='stable')
+    widths = boxes.w[order].astype(np.int64)
+    heights = boxes.h[order].astype(np.int64)
+
+    # First phase: NFDH, the first box of every strip is also the highest one
+    strip_starts = next_fit_breaks(widths, bin_width)
+    strip_heights = heights[strip_starts]
+
+    # Second phase: NFD on the strip heights
+    bin_starts = next_fit_breaks(strip_heights, bin_height)
+
+    unstrip_bins(boxes, order, widths, strip_starts, strip_heights, bin_starts)
+    return boxes
+
+
+def next_fit_breaks(sizes, capacity) -> np.ndarray:
+    '''
+    Returns the indices where next-fit opens a new strip or bin\\
+    One binary search over the prefix sums finds where a group starting at each
+    item would end, then the chain of groups from the first item is followed by
+    pointer doubling, so it costs O(n log n) in NumPy for any number of groups
+    '''
+    n = len(sizes)
+    ends = np.cumsum(sizes, dtype=np.int64)
+    # Start of the next group after a group starting at each item, n past the end
+    jump = np.searchsorted(ends, ends - sizes + capacity, side='right')
+    np.maximum(jump, np.arange(1, n + 1), out=jump)
+    jump = np.append(jump, n)
+    starts = np.zeros(n + 1, dtype=bool)
+    starts[0] = True
+    while True:
+        # starts has the first 2^k group starts and jump skips 2^k groups
+        found = jump[np.flatnonzero(starts)]
+        if starts[found].all():
+            break
+        starts[found] = True
+        jump = jump[jump]
+    return np.flatnonzero(starts[:n])
+
+
+def unstrip_bins(boxes: BoxArray, order, widths, strip_starts, strip_heights, bin_starts) -> None:
+    '''
+    Sets the positions of the boxes in each bin
+    ### Arguments
+    - `boxes` - array to write the positions and bins into
+    - `order` - indices of the boxes in packing order
+    - `widths` - widths of the boxes in packing order
+    - `strip_starts` - packing order index of the first box of each strip
+    - `strip_heights` - height of each strip
+    - `bin_starts` - index of the first strip of each bin
+    '''
+    n = len(order)
+    strip_sizes = np.diff(np.append(strip_starts, n))
+    bin_sizes = np.diff(np.append(bin_starts, len(strip_starts)))
+
+    # x is the width of the boxes placed before in the same strip
+    ends = np.cumsum(widths)
+    box_strip = np.repeat(np.arange(len(strip_starts)), strip_sizes)
+    x = ends - widths - (ends - widths)[strip_starts][box_strip]
+
+    # y is the height of the strips placed before in the same bin
+    tops = np.cumsum(strip_heights)
+    strip_bin = np.repeat(np.arange(len(bin_starts)), bin_sizes)
+    strip_y = tops - strip_heights - (tops - strip_heights)[bin_starts][strip_bin]
+
+    boxes.x[order] = x
+    boxes.y[order] = strip_y[box_strip]
+    boxes.bin_id[order] = strip_bin[box_strip]
@@ -0,0 +1,172 @@
+'''
+Content-addressed cache of the solver results
+
+    cache = ResultCache(max_bytes=64 << 20, directory="~/.cache/binpack")
+    key = cache.key(instance_digest(bin_size, boxes), "HFF")
+    records = cache.get(key)
+
+Keys hash the bin size, the multiset of the box sizes, the algorithm and
+the source of the modules the algorithms are built from, so editing
+`algorithms.py` makes every old entry unreachable. Results are stored as
+`(box w, box h, x, y, turned)` records, boxes of the same size are
+interchangeable so the records can be given back to any box list with
+the same multiset.
+'''
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from importlib.util import find_spec
+
+# Modules whose source defines the packing of every algorithm
+CODE_MODULES = ("algorithms", "placement", "structures")
+RECORD_SIZE = 5
+
+_code_versions = {}
+
+def code_version() -> str:
+    '''Returns the hash of the algorithm modules source, reread only when a file changes'''
+    digest = hashlib.blake2b(digest_size=16)
+    for name in CODE_MODULES:
+        spec = find_spec(name)
+        path = spec.origin if spec else None
+        if not path or not os.path.exists(path):
+            digest.update(name.encode())
+            continue
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = _code_versions.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path, 'rb') as file:
+                cached = (stamp, hashlib.blake2b(file.read(), digest_size=16).digest())
+            _code_versions[path] = cached
+        digest.update(cached[1])
+    return digest.hexdigest()
+
+def instance_digest(bin_size: tuple, boxes: list) -> bytes:
+    '''Returns the hash of the bin size and of the multiset of the box sizes'''
+    sizes = array('q', sorted(box.w << 32 | box.h for box in boxes))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(array('q', bin_size).tobytes())
+    digest.update(sizes.tobytes())
+    return digest.digest()
+
+class ResultCache:
+    '''
+    LRU cache of the packings in memory with an optional sqlite file below it
+    ### Arguments
+    - `max_bytes` - size of the memory layer, least recently used entries are evicted first
+    - `directory` - directory of the disk layer, None keeps the cache in memory only
+    ### Values
+    - `.hits and .misses` - number of the lookups found and not found
+    '''
+    def __init__(self, max_bytes=64 << 20, directory=None):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.__entries: OrderedDict[str, bytes] = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.__path = None
+        if directory is not None:
+            directory = os.path.expanduser(directory)
+            os.makedirs(directory, exist_ok=True)
+            self.__path = os.path.join(directory, "results.sqlite3")
+            with self.__connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def key(self, instance: bytes, algorithm_name: str, allow_rotation=False) -> str:
+        '''Returns the key of the instance, given by `instance_digest`, solved by the algorithm'''
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(instance)
+        digest.update(f"{algorithm_name}:{int(allow_rotation)}:{code_version()}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        '''
+        Returns the bins as lists of `(box w, box h, x, y, turned)` records or None
+        '''
+        with self.__lock:
+            data = self.__entries.get(key)
+            if data is not None:
+                self.__entries.move_to_end(key)
+        if data is None and self.__path:
+            with self.__connect() as db:
+                row = db.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row:
+                data = bytes(row[0])
+                self.__remember(key, data)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.__decode(data)
+
+    def put(self, key: str, bins: list[list]) -> None:
+        '''Stores the bins of placements under the key'''
+        data = self.__encode(bins)
+        self.__remember(key, data)
+        if self.__path:
+            with self.__connect() as db:
+                db.execute("INSERT OR REPLACE INTO results (key, data) VALUES (?, ?)", (key, data))
+
+    def clear(self) -> None:
+        '''Removes every entry, the disk layer included'''
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+        if self.__path:
+            with self.__connect() as db:
+                db.execute("DELETE FROM results")
+
+    def __remember(self, key: str, data: bytes) -> None:
+        '''Adds the entry to the memory layer and evicts the old ones over the size limit'''
+        if len(data) > self.max_bytes:
+            return
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__size -= len(old)
+            self.__entries[key] = data
+            self.__size += len(data)
+            while self.__size > self.max_bytes:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__size -= len(evicted)
+
+    @contextmanager
+    def __connect(self):
+        '''Opens the disk layer for a single statement, commits and closes it'''
+        db = sqlite3.connect(self.__path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def __encode(bins: list[list]) -> bytes:
+        '''Packs the bin lengths followed by the records of every placement'''
+        values = array('q', [len(bins)])
+        values.extend(len(bin) for bin in bins)
+        for bin in bins:
+            for p in bin:
+                values.extend((p.box.w, p.box.h, p.x, p.y, int(p.w != p.box.w)))
+        return values.tobytes()
+
+    @staticmethod
+    def __decode(data: bytes) -> list[list[tuple]]:
+        values = array('q')
+        values.frombytes(data)
+        count = values[0]
+        bins, start = [], 1 + count
+        for length in values[1:1 + count]:
+            end = start + length * RECORD_SIZE
+            chunk = values[start:end]
+            bins.append([tuple(chunk[i:i + RECORD_SIZE]) for i in range(0, len(chunk), RECORD_SIZE)])
+            start = end
+        return bins
@@ -0,0 +1,105 @@
+'''
+Reproducible instance generators\\
+Every generator takes an explicit seed and draws all the boxes at once
+with NumPy, so the same seed always gives the same instance
+'''
+import numpy as np
+from boxarray import BoxArray
+from helpers import ValidationError
+
+# Berkey and Wang classes I-VI: class -> (bin side, biggest box side), box sides are uniform from 1
+BERKEY_WANG_CLASSES = {1: (10, 10), 2: (30, 10), 3: (40, 35), 4: (100, 35), 5: (100, 100), 6: (300, 100)}
+# Martello and Vigo classes VII-X: class -> box type drawn with 70% probability, other types get 10% each
+MARTELLO_VIGO_CLASSES = {7: 1, 8: 2, 9: 3, 10: 4}
+MARTELLO_VIGO_BIN = 100
+
+def uniform(n: int, min_w: int, max_w: int, min_h: int, max_h: int, seed=None) -> BoxArray:
+    '''
+    Boxes with widths and heights uniform in the given ranges, bounds included
+    ### Arguments
+    - `n` - number of the boxes
+    - `min_w`, `max_w`, `min_h`, `max_h` - size ranges
+    - `seed` - seed of the random generator
+    '''
+    if min_w > max_w or min_h > max_h or min_w <= 0 or min_h <= 0:
+        raise ValidationError("Wrong generation dimensions", "gen_dim")
+    rng = np.random.default_rng(seed)
+    return BoxArray(rng.integers(min_w, max_w, size=n, endpoint=True),
+                    rng.integers(min_h, max_h, size=n, endpoint=True))
+
+def instance_class(number: int, n: int, seed=None) -> tuple[tuple, BoxArray]:
+    '''
+    Classic benchmark classes I-X\\
+    I-VI by Berkey and Wang, VII-X by Martello and Vigo
+    ### Returns
+    `(bin_size, boxes)` as the class defines the bin size too
+    '''
+    rng = np.random.default_rng(seed)
+    if number in BERKEY_WANG_CLASSES:
+        side, biggest = BERKEY_WANG_CLASSES[number]
+        return (side, side), BoxArray(rng.integers(1, biggest, size=n, endpoint=True),
+                                      rng.integers(1, biggest, size=n, endpoint=True))
+    if number not in MARTELLO_VIGO_CLASSES:
+        raise ValidationError(f"Unknown instance class {number}", "gen_class")
+
+    W = H = MARTELLO_VIGO_BIN
+    # Type -> ((min w, max w), (min h, max h))
+    types = {
+        1: ((-(-2 * W // 3), W), (1, H // 2)),  # Wide
+        2: ((1, W // 2), (-(-2 * H // 3), H)),  # Tall
+        3: ((W // 2, W), (H // 2, H)),          # Large
+        4: ((1, W // 2), (1, H // 2)),          # Small
+    }
+    main_type = MARTELLO_VIGO_CLASSES[number]
+    probabilities = [0.7 if t == main_type else 0.1 for t in types]
+    box_types = rng.choice(list(types), size=n, p=probabilities)
+    return (W, H), _draw_types(rng, box_types, types)
+
+def real_world(n: int, bin_size: tuple, seed=None) -> BoxArray:
+    '''
+    Mix of tall, wide and medium boxes seen in real loads\\
+    35% tall, 35% wide and 30% medium boxes, scaled to the bin
+    '''
+    W, H = bin_size
+    types = {
+        1: ((1, max(1, W // 4)), (max(1, H // 2), H)),                      # Tall
+        2: ((max(1, W // 2), W), (1, max(1, H // 4))),                      # Wide
+        3: ((max(1, W // 8), max(1, W // 2)), (max(1, H // 8), max(1, H // 2))), # Medium
+    }
+    rng = np.random.default_rng(seed)
+    box_types = rng.choice(list(types), size=n, p=[0.35, 0.35, 0.3])
+    return _draw_types(rng, box_types, types)
+
+def generate(distribution: str, n: int, bin_size: tuple = None, seed=None, **ranges) -> tuple[tuple, BoxArray]:
+    '''
+    Generates an instance by the name of the distribution
+    ### Arguments
+    - `distribution` - 'uniform', 'real_world' or 'class1' to 'class10'
+    - `n` - number of the boxes
+    - `bin_size` - size of the bin, not needed for the classes
+    - `seed` - seed of the random generator
+    - `ranges` - min_w, max_w, min_h, max_h for 'uniform', default to 1 and the bin size
+    ### Returns
+    `(bin_size, boxes)`
+    '''
+    if distribution.startswith("class") and distribution[5:].isdigit():
+        return instance_class(int(distribution[5:]), n, seed)
+    if bin_size is None:
+        raise ValidationError("Bin size not initialized", "bin_size")
+    if distribution == "uniform":
+        return bin_size, uniform(n, ranges.get("min_w", 1), ranges.get("max_w", bin_size[0]),
+                                 ranges.get("min_h", 1), ranges.get("max_h", bin_size[1]), seed)
+    if distribution == "real_world":
+        return bin_size, real_world(n, bin_size, seed)
+    raise ValidationError(f"Unknown distribution {distribution}", "gen_distribution")
+
+def _draw_types(rng, box_types, types: dict) -> BoxArray:
+    '''Draws the sizes of every box from the ranges of its type'''
+    w = np.empty(len(box_types), dtype=np.int32)
+    h = np.empty(len(box_types), dtype=np.int32)
+    for t, ((min_w, max_w), (min_h, max_h)) in types.items():
+        mask = box_types == t
+        count = int(mask.sum())
+        w[mask] = rng.integers(min_w, max_w, size=count, endpoint=True)
+        h[mask] = rng.integers(min_h, max_h, size=count, endpoint=True)
+    return BoxArray(w, h)
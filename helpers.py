@@ -1,6 +1,14 @@
-import random
-import copy
+import cProfile
+import io
+import mmap
+import os
+import pstats
 import re
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from cache import instance_digest
 
 # Exceptions
 class ValidationError(Exception):
@@ -9,10 +17,78 @@ class ValidationError(Exception):
     ### Values
     - `.message` - message of the error
     - `.val` - is a specific error code string
+    - `.errors` - list of all the errors when many were found at once,\\
+    the error itself describes the first one
     '''
-    def __init__(self, message, val):
+    def __init__(self, message, val, errors=None):
         super().__init__(message)
         self.val = val
+        self.errors = errors or []
+
+class SolveCancelled(Exception):
+    '''Error thrown from a progress callback to stop the running algorithm'''
+
+def read_boxes(source, bin_size=None, chunk_size=1 << 20, allow_rotation=False) -> tuple[array, array]:
+    '''
+    Reads WxH box lines in chunks straight into integer arrays
+    ### Arguments
+    - `source` - str, bytes, text or binary file object or mmap
+    - `bin_size` - if given, boxes bigger than the bin are invalid
+    - `chunk_size` - number of characters read at once
+    - `allow_rotation` - boxes fitting the bin only when turned are valid
+    ### Returns
+    `(widths, heights)` arrays, if any line is invalid raises ValidationError
+    with every invalid line in `.errors`, codes are `bad_line:i` and `box_size:i`
+    '''
+    max_w, max_h = bin_size if bin_size else (float('inf'), float('inf'))
+    widths, heights = array('q'), array('q')
+    errors = []
+
+    def chunks():
+        if isinstance(source, (str, bytes)):
+            for start in range(0, len(source), chunk_size):
+                yield source[start:start + chunk_size]
+        else:
+            while chunk := source.read(chunk_size):
+                yield chunk
+
+    def lines():
+        rest = None
+        for chunk in chunks():
+            if rest is None:
+                rest = chunk[:0]
+            chunk_lines = (rest + chunk).split(b"\n" if isinstance(chunk, bytes) else "\n")
+            rest = chunk_lines.pop() # Last line may continue in the next chunk
+            yield from chunk_lines
+        if rest:
+            yield rest
+
+    for i, line in enumerate(lines()):
+        binary = isinstance(line, bytes)
+        if line[-1:] == (b"\r" if binary else "\r"):
+            line = line[:-1]
+        width, sep, height = line.partition(b"x" if binary else "x")
+        numbers = sep and (width.isdigit() and height.isdigit() if binary else width.isdecimal() and height.isdecimal())
+        if numbers:
+            width, height = int(width), int(height)
+            if width > 0 and height > 0 and (width <= max_w and height <= max_h
+                                             or allow_rotation and height <= max_w and width <= max_h):
+                widths.append(width)
+                heights.append(height)
+                continue
+
+        text = line.decode(errors="replace") if binary else line
+        if not numbers:
+            errors.append(ValidationError(f"Error while parsing boxes input at line {i+1}: {text}", f"bad_line:{i}"))
+        elif width > max_w or height > max_h:
+            errors.append(ValidationError(f"To big box at line {i+1}: {text}", f"box_size:{i}"))
+        else:
+            errors.append(ValidationError(f"Box dimensions must be bigger than zero at line {i+1}: {text}", f"box_size:{i}"))
+
+    if errors:
+        more = f" (and {len(errors) - 1} more invalid lines)" if len(errors) > 1 else ""
+        raise ValidationError(f"{errors[0]}{more}", errors[0].val, errors)
+    return widths, heights
 
 class Box:
     '''
@@ -22,6 +98,8 @@ class Box:
     - `.x and .y` - position of the box\\
     if equal to None then the box is not positioned
     '''
+    __slots__ = ('w', 'h', 'x', 'y')
+
     def __init__(self,size: tuple):
         if any(x <= 0 for x in size):
             raise ValidationError("Box dimensions must be bigger than zero", "box_size")
@@ -31,13 +109,153 @@ class Box:
     def __repr__(self):
         return f"Box(Pos({self.x}, {self.y}), Size{self.w, self.h})\n"
 
+class Placement:
+    '''
+    Position of a single box in a solution\\
+    Algorithms move placements around, the solved box is never modified
+    ### Values
+    - `.box` - the solved box
+    - `.w and .h` - size of the box
+    - `.x and .y` - position of the box\\
+    if equal to None then the box is not positioned
+    '''
+    __slots__ = ('box', 'w', 'h', 'x', 'y')
+
+    def __init__(self, box: Box):
+        self.box = box
+        self.w, self.h = box.w, box.h
+        self.x, self.y = None, None
+
+    def __repr__(self):
+        return f"Placement(Pos({self.x}, {self.y}), Size{self.w, self.h})\n"
+
+class SolveStats:
+    '''
+    Opt-in instrumentation of a single algorithm run\\
+    Algorithms only touch it when it is passed, so without it they run at full speed
+    ### Values
+    - `.phases` - seconds spent in each phase, `total` is the whole run
+    - `.counters` - counters like `strips_opened`, `bins_opened`,
+    `position_searches` and `candidates` (positions tried, one overlap query each)
+    - `.profiler` - None, `'cprofile'` or `'pyinstrument'`
+    - `.profile` - text report of the profiler
+    '''
+    def __init__(self, profiler=None):
+        if profiler not in (None, 'cprofile', 'pyinstrument'):
+            raise ValidationError(f"Unknown profiler: {profiler}", "profiler")
+        self.phases = {}
+        self.counters = {}
+        self.profiler = profiler
+        self.profile = None
+
+    def __repr__(self):
+        phases = ", ".join(f"{name} {seconds:.4f}s" for name, seconds in self.phases.items())
+        counters = ", ".join(f"{name} {value}" for name, value in self.counters.items())
+        return f"SolveStats({phases}; {counters})"
+
+    def count(self, name: str, value=1) -> None:
+        '''Adds the value to the counter'''
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def phase(self, name: str):
+        '''Adds the time spent inside the with block to the phase'''
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start_time
+
+    def run(self, function, *args, **kwargs):
+        '''Calls the function under the chosen profiler and times it as the total phase'''
+        with self.phase("total"):
+            if self.profiler == 'cprofile':
+                profile = cProfile.Profile()
+                result = profile.runcall(function, *args, **kwargs)
+                report = io.StringIO()
+                pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(30)
+                self.profile = report.getvalue()
+            elif self.profiler == 'pyinstrument':
+                try:
+                    from pyinstrument import Profiler
+                except ImportError:
+                    raise ValidationError("pyinstrument is not installed", "profiler")
+                profile = Profiler()
+                profile.start()
+                try:
+                    result = function(*args, **kwargs)
+                finally:
+                    profile.stop()
+                self.profile = profile.output_text()
+            else:
+                result = function(*args, **kwargs)
+        return result
+
+class SolveResult:
+    '''
+    Result of a single algorithm run
+    ### Values
+    - `.name` - name of the algorithm
+    - `.bins` - list of bins with the placements of the boxes
+    - `.time` - wall time of the algorithm in seconds
+    - `.bin_count` - number of the bins used
+    - `.fill` - ratio of the boxes area to the area of the used bins
+    - `.stats` - SolveStats of the run, if collected
+    - `.lower_bound` - lower bound on the number of bins of the instance, if given
+    - `.gap` - ratio of the bins over the lower bound, 0.0 when the packing is optimal, None without the bound
+    - `.order` - the placements in the order they were packed, in the order of the bins when not given
+    '''
+    def __init__(self, name: str, bins: list[list[Placement]], bin_size: tuple, elapsed: float, stats=None,
+                 lower_bound=None, order=None):
+        self.name = name
+        self.stats = stats
+        self.bins = bins
+        self.order = order if order is not None else [p for bin in bins for p in bin]
+        self.time = elapsed
+        self.bin_count = len(bins)
+        boxes_area = sum(p.w * p.h for bin in bins for p in bin)
+        self.fill = boxes_area / (bin_size[0] * bin_size[1] * len(bins)) if bins else 0.0
+        self.lower_bound = lower_bound
+        self.gap = self.bin_count / lower_bound - 1 if lower_bound else None
+
+    def __repr__(self):
+        gap = f", gap {self.gap:.2%}" if self.gap is not None else ""
+        return f"SolveResult({self.name}, {self.bin_count} bins, fill {self.fill:.2%}{gap}, {self.time:.4f}s)"
+
+def _solve_worker(name: str, bin_size: tuple, boxes: list[Box], stats=None, allow_rotation=False):
+    '''
+    Runs the algorithm in a worker process\\
+    Returns the bins as (box index, x, y, w, h) tuples, the wall time, the stats
+    and the packing order as positions in the flattened bins
+    '''
+    from algorithms import Algorithms
+
+    placements = [Placement(box) for box in boxes]
+    index = {id(box): i for i, box in enumerate(boxes)}
+    start_time = time.perf_counter()
+    if stats:
+        bins = stats.run(getattr(Algorithms, name), bin_size, placements, stats=stats, allow_rotation=allow_rotation)
+    else:
+        bins = getattr(Algorithms, name)(bin_size, placements, allow_rotation=allow_rotation)
+    elapsed_time = time.perf_counter() - start_time
+    position = {id(p): k for k, p in enumerate(p for bin in bins for p in bin)}
+    order = array('q', [position[id(p)] for p in placements])
+    return [[(index[id(p.box)], p.x, p.y, p.w, p.h) for p in bin] for bin in bins], elapsed_time, stats, order
+
 class BoxStackingSolver:
-    '''Main problem solving class'''
-    def __init__(self):
+    '''
+    Main problem solving class
+    ### Arguments
+    - `cache` - optional ResultCache, solving an instance again with the same
+    algorithm then returns the stored packing
+    '''
+    def __init__(self, cache=None):
         self.boxes = []
         self.bin_size = None
+        self.cache = cache
+        self.__solutions = {}   # (algorithm name, allow_rotation) -> (bin size, bins, fill of the last full solve)
 
-    def generate_boxes(self, min_w: int, max_w: int, min_h: int, max_h: int, num_boxes: int) -> None:
+    def generate_boxes(self, min_w: int, max_w: int, min_h: int, max_h: int, num_boxes: int, seed=None) -> None:
         '''
         Initializes the self.boxes list
         ### Arguments
@@ -46,54 +264,250 @@ class BoxStackingSolver:
         - `min_h` - min height of the boxes
         - `max_h` - max height of the boxes
         - `num_boxes` - number of the boxes
+        - `seed` - seed of the random generator, the same seed gives the same boxes
         '''
+        from generators import uniform
+
         if min_w > max_w or min_h > max_h or min_w <= 0 or min_h <= 0:
             raise ValidationError("Wrong generation dimensions", "gen_dim")
 
-        self.boxes = [] # Empty the array
-        for _ in range(num_boxes):
-            self.boxes.append(Box((random.randint(min_w, min(max_w, self.bin_size[0])),
-                                    random.randint(min_h, min(max_h, self.bin_size[1])))))
+        boxes = uniform(num_boxes, min_w, min(max_w, self.bin_size[0]), min_h, min(max_h, self.bin_size[1]), seed)
+        self.boxes = boxes.to_boxes()
 
-    def solve(self, algorithm) -> list[Box]:
+    def solve(self, algorithm, progress=None, stats=None, allow_rotation=False, order=None) -> list[list[Placement]]:
         '''
-        Run the solver using selected algorithm
+        Run the solver using selected algorithm\\
+        Returns bins of placements referencing the boxes, the boxes are not modified
         ### Arguments
         - `algorithm` - reference to a method of Algorithms Class
+        - `progress` - optional `progress(done, total)` callback called for every box,\\
+        raise SolveCancelled from it to stop the algorithm
+        - `stats` - optional SolveStats to collect the phase timings, counters and profile
+        - `allow_rotation` - boxes may be turned by 90 degrees, the placements get the turned size
+        - `order` - optional list, the placements are added to it in the order they were packed,
+        in the order of the bins for cached results
         '''
-        # Validate state of the variables
-        if self.bin_size == None:
-            raise ValidationError("Bin size not initialized", "bin_size")
-        if not self.boxes:
-            raise ValidationError("List of boxes not initialized", "boxes")
+        self.__validate()
         if not callable(algorithm):
             raise ValidationError("Wrong algorithm", "algorithm")
 
+        # Runs with stats measure the algorithm, so they never come from the cache
+        key = None
+        name = self.__cached_name(algorithm)
+        if name and not stats:
+            key = self.cache.key(instance_digest(self.bin_size, self.boxes), name, allow_rotation)
+            records = self.cache.get(key)
+            if records is not None:
+                if progress:
+                    progress(len(self.boxes), len(self.boxes))
+                bins = self.__from_records(records)
+                if order is not None:
+                    order.extend(p for bin in bins for p in bin)
+                return bins
+
         # Run selected algorithm on the chosen data
-        return algorithm(self.bin_size, copy.deepcopy(self.boxes))
+        placements = [Placement(box) for box in self.boxes]
+        if stats:
+            bins = stats.run(algorithm, self.bin_size, placements, progress=progress, stats=stats,
+                             allow_rotation=allow_rotation)
+        else:
+            bins = algorithm(self.bin_size, placements, progress=progress, allow_rotation=allow_rotation)
+        if key:
+            self.cache.put(key, bins)
+        if order is not None:
+            order.extend(placements)    # Algorithms sort the list into the order they pack the boxes
+        return bins
+
+    def solve_incremental(self, algorithm, progress=None, allow_rotation=False, max_gap=0.05,
+                          order=None) -> list[list[Placement]]:
+        '''
+        Repairs the previous packing of the algorithm after the boxes were edited\\
+        The first run of each algorithm is a full solve
+        ### Arguments
+        - `algorithm` - reference to a method of Algorithms Class
+        - `progress` - optional `progress(done, total)` callback, see solve
+        - `allow_rotation` - boxes may be turned by 90 degrees
+        - `max_gap` - the repaired packing is dropped for a full solve when its fill is lower
+        than the fill of the last full solve by more than this ratio
+        - `order` - optional list which gets the placements in packing order, see solve,
+        in the order of the bins for repaired packings
+        '''
+        from incremental import repair
+
+        self.__validate()
+        name = getattr(algorithm, '__name__', None)
+        previous = self.__solutions.get((name, allow_rotation))
+        if previous and previous[0] == self.bin_size:
+            _, bins, full_fill = previous
+            bins, edits = repair(self.bin_size, bins, self.boxes, name, allow_rotation, progress)
+            if not edits or self.__fill(bins) >= full_fill * (1 - max_gap):
+                self.__solutions[name, allow_rotation] = (self.bin_size, bins, full_fill)
+                if order is not None:
+                    order.extend(p for bin in bins for p in bin)
+                return bins
+
+        bins = self.solve(algorithm, progress=progress, allow_rotation=allow_rotation, order=order)
+        self.__solutions[name, allow_rotation] = (self.bin_size, bins, self.__fill(bins))
+        return bins
+
+    def improve(self, time_limit=10.0, restarts=None, executor=None, stats=None, allow_rotation=False, seed=None,
+                progress=None, order=None) -> list[list[Placement]]:
+        '''
+        Searches for a packing with fewer bins than HBF for the time limit, see improve.improve\\
+        Returns bins of placements referencing the boxes, the boxes are not modified,
+        `order` gets the placements in packing order like in solve
+        '''
+        from improve import improve
+
+        self.__validate()
+        placements = [Placement(box) for box in self.boxes]
+        bins = improve(self.bin_size, placements, time_limit, restarts, executor, stats, allow_rotation, seed,
+                       self.lower_bound(allow_rotation), progress)
+        if order is not None:
+            order.extend(placements)
+        return bins
+
+    def lower_bound(self, allow_rotation=False) -> int:
+        '''Returns the lower bound on the number of bins for the boxes, see bounds.lower_bound'''
+        from bounds import lower_bound
+
+        self.__validate()
+        return lower_bound(self.bin_size, self.boxes, allow_rotation)
+
+    def solve_many(self, algorithms: list, executor=None, stats=False, profiler=None, allow_rotation=False,
+                   stop_at_bound=False):
+        '''
+        Runs the algorithms in parallel, each one on its own copy of the boxes\\
+        Yields SolveResult objects in the order the algorithms finish
+        ### Arguments
+        - `algorithms` - names or methods of the Algorithms Class
+        - `executor` - concurrent.futures executor to use,\\
+        if None a ProcessPoolExecutor is created for this call
+        - `stats` - collect SolveStats for every algorithm
+        - `profiler` - profiler used with the stats, see SolveStats
+        - `allow_rotation` - boxes may be turned by 90 degrees
+        - `stop_at_bound` - stop after the first result reaching the lower bound,
+        no other algorithm can use fewer bins
+        '''
+        from algorithms import Algorithms
+
+        self.__validate()
+        names = [getattr(algorithm, '__name__', algorithm) for algorithm in algorithms]
+        for name in names:
+            if name not in Algorithms.get_implemented_names():
+                raise ValidationError(f"Wrong algorithm: {name}", "algorithm")
+        if not names:
+            return
+        bound = self.lower_bound(allow_rotation)
+
+        # Cached results come first, only the other algorithms are run
+        keys = {}
+        if self.cache is not None and not stats:
+            instance = instance_digest(self.bin_size, self.boxes)
+            for name in list(names):
+                start_time = time.perf_counter()
+                keys[name] = self.cache.key(instance, name, allow_rotation)
+                records = self.cache.get(keys[name])
+                if records is not None:
+                    names.remove(name)
+                    result = SolveResult(name, self.__from_records(records), self.bin_size,
+                                         time.perf_counter() - start_time, lower_bound=bound)
+                    yield result
+                    if stop_at_bound and result.bin_count <= bound:
+                        return
+        if not names:
+            return
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=min(len(names), os.cpu_count() or 1))
+        futures = {}
+        try:
+            futures = {executor.submit(_solve_worker, name, self.bin_size, self.boxes,
+                                       SolveStats(profiler) if stats else None, allow_rotation): name for name in names}
+            for future in as_completed(futures):
+                bins, elapsed_time, run_stats, order = future.result()
+                name = futures[future]
+                placements = self.__to_placements(bins)
+                if name in keys:
+                    self.cache.put(keys[name], placements)
+                flat = [p for bin in placements for p in bin]
+                result = SolveResult(name, placements, self.bin_size, elapsed_time, run_stats, bound,
+                                     [flat[k] for k in order])
+                yield result
+                if stop_at_bound and result.bin_count <= bound:
+                    break
+        finally:
+            # Algorithms still waiting for a worker are dropped when the run stops early
+            for future in futures:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
     
     def get_boxes_text(self) -> str:
         '''Returns the string with box dimensions'''
         arr = [f"{box.w}x{box.h}" for box in self.boxes]
         return "\n".join(arr)
     
-    def update_boxes_from_txt(self, text: str) -> None:
-        '''Updates the state of solver boxes list'''
-        new_boxes = []
-        for i, line in enumerate(text.splitlines()):
-            match = re.match(r'^(\d+)x(\d+)$', line)
-            if match:
-                width, height = map(int, match.groups())
-                if width > self.bin_size[0] or height > self.bin_size[1]:
-                    raise ValidationError( f"To big box at line {i+1}: {line}", f"box_size:{i}")
-                try:
-                    new_boxes.append(Box((width, height)))
-                except ValidationError as e:
-                    if e.val == "box_size":
-                        raise ValidationError(f"{e} at line {i+1}: {line}", f"{e.val}:{i}")
-            else:
-                raise ValidationError( f"Error while parsing boxes input at line {i+1}: {line}", f"bad_line:{i}")
-        self.boxes = new_boxes
+    def update_boxes_from_txt(self, text: str, allow_rotation=False) -> None:
+        '''Updates the state of solver boxes list, with `allow_rotation` boxes may fit the bin turned'''
+        widths, heights = read_boxes(text, self.bin_size, allow_rotation=allow_rotation)
+        self.boxes = [Box(size) for size in zip(widths, heights)]
+
+    def update_boxes_from_file(self, path: str, allow_rotation=False) -> None:
+        '''Updates the state of solver boxes list from a memory-mapped instance file'''
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                self.boxes = []
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                widths, heights = read_boxes(data, self.bin_size, allow_rotation=allow_rotation)
+        self.boxes = [Box(size) for size in zip(widths, heights)]
+
+    def __validate(self) -> None:
+        '''Validates the state of the variables before solving'''
+        if self.bin_size == None:
+            raise ValidationError("Bin size not initialized", "bin_size")
+        if not self.boxes:
+            raise ValidationError("List of boxes not initialized", "boxes")
+
+    def __fill(self, bins: list[list[Placement]]) -> float:
+        '''Returns the ratio of the boxes area to the area of the bins'''
+        if not bins:
+            return 0.0
+        return sum(p.w * p.h for bin in bins for p in bin) / (self.bin_size[0] * self.bin_size[1] * len(bins))
+
+    def __cached_name(self, algorithm):
+        '''Returns the name of the algorithm if its results can be cached, otherwise None'''
+        from algorithms import Algorithms
+
+        if self.cache is None:
+            return None
+        name = getattr(algorithm, '__name__', None)
+        if name in Algorithms.get_implemented_names() and getattr(Algorithms, name) is algorithm:
+            return name
+        return None
+
+    def __from_records(self, bins: list[list[tuple]]) -> list[list[Placement]]:
+        '''Gives the cached (box w, box h, x, y, turned) records to the boxes of the same size'''
+        by_size = {}
+        for i in range(len(self.boxes) - 1, -1, -1):
+            box = self.boxes[i]
+            by_size.setdefault((box.w, box.h), []).append(i)
+        return self.__to_placements([[(by_size[w, h].pop(), x, y, h, w) if turned else (by_size[w, h].pop(), x, y, w, h)
+                                      for w, h, x, y, turned in bin] for bin in bins])
+
+    def __to_placements(self, bins: list[list[tuple]]) -> list[list[Placement]]:
+        '''Turns (box index, x, y, w, h) tuples into placements of the solver boxes'''
+        placed_bins = []
+        for bin in bins:
+            placed_bin = []
+            for i, x, y, w, h in bin:
+                placement = Placement(self.boxes[i])
+                placement.x, placement.y, placement.w, placement.h = x, y, w, h
+                placed_bin.append(placement)
+            placed_bins.append(placed_bin)
+        return placed_bins
 
     def update_bin_size(self, text: str) -> None:
         match = re.match(r'^([1-9]\d*)x([1-9]\d*)$', text)
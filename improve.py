@@ -0,0 +1,321 @@
+'''
+Improvement of a packing by simulated annealing over the order of the boxes
+
+    bins = improve(bin_size, placements, time_limit=10.0)
+
+A state of the search is the order of the boxes and which boxes are turned.
+It is decoded like HBF: the boxes in their order go onto the strip with the
+least space left that is tall and wide enough for them, then the strips are put
+into bins by best-fit decreasing height. The first state is the HBF order, so
+without rotation the search starts from the HBF packing and never returns a
+worse one. Strip heights seen before keep their bin count, most moves only
+change which boxes share the strips.
+
+Moves swap two close boxes or turn one box, so the strips made before the first
+changed box stay the same. The decoder keeps a copy of its state every
+`CHECKPOINT_STRIDE` boxes and decodes a new state only from the last copy before
+the move. Independent restarts run in a process pool until the time limit or
+until one of them reaches the lower bound of the bins.
+'''
+import math
+import os
+import random
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from contextlib import nullcontext
+from multiprocessing import Manager
+from helpers import Placement
+from structures import BestFitIndex
+
+CHECKPOINT_STRIDE = 64  # Boxes between two copies of the decoder state
+SWAP_DISTANCE = 32      # Farthest position of the box swapped with a chosen one
+TURN_RATE = 0.25        # Share of the moves turning a box, with rotation
+# Temperatures at the start and at the end of the time limit, in bins
+START_TEMPERATURE = 0.02
+END_TEMPERATURE = 0.001
+CHECK_INTERVAL = 32     # Moves between two looks at the other restarts, the clock is read on every move
+COST_CACHE_SIZE = 4096  # Strip heights with a known cost, most moves do not change them
+
+def improve(bin_size: tuple, boxes: list[Placement], time_limit=10.0, restarts=None, executor=None, stats=None,
+            allow_rotation=False, seed=None, lower_bound=None, progress=None) -> list[list[Placement]]:
+    '''
+    Packs the boxes in the best order found by the restarts in the time limit
+    ### Arguments
+    - `bin_size` - (width, height) of the bins
+    - `boxes` - placements of the boxes, they are moved, turned and put in the packing order like by the algorithms
+    - `time_limit` - wall time of the search in seconds
+    - `restarts` - number of the independent searches, one for each CPU by default
+    - `executor` - concurrent.futures executor to use,\\
+    if None a ProcessPoolExecutor is created for this call
+    - `stats` - optional SolveStats, counts the decoded states and the accepted moves
+    - `allow_rotation` - boxes may be turned by 90 degrees
+    - `seed` - seed of the random moves, restart i uses seed + i
+    - `lower_bound` - the search stops at this number of bins, `bounds.lower_bound` by default
+    - `progress` - optional `progress(done, total)` callback called for every finished restart
+    ### Returns
+    Bins of the placements, like the algorithms of Algorithms
+    '''
+    if not boxes:
+        return []
+    if lower_bound is None:
+        from bounds import lower_bound as find_lower_bound
+        lower_bound = find_lower_bound(bin_size, boxes, allow_rotation)
+    restarts = restarts or os.cpu_count() or 1
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    widths = [box.w for box in boxes]
+    heights = [box.h for box in boxes]
+    deadline = time.time() + time_limit
+
+    best = None
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=min(restarts, os.cpu_count() or 1))
+    phase = stats.phase("search") if stats else nullcontext()
+    with phase, Manager() as manager:
+        stop = manager.Event()  # Set when a restart reaches the lower bound, the others stop then
+        futures = {}
+        try:
+            for restart in range(restarts):
+                order, turned = _start_state(bin_size, widths, heights, allow_rotation and restart % 2 == 1)
+                futures[executor.submit(_search, bin_size, widths, heights, order, turned, allow_rotation,
+                                        seed + restart, deadline, lower_bound, stop)] = restart
+            for done, future in enumerate(as_completed(futures), 1):
+                cost, order, turned, decodes, accepted = future.result()
+                if best is None or (cost, futures[future]) < best[:2]:
+                    best = (cost, futures[future], order, turned)
+                if stats:
+                    stats.count("decodes", decodes)
+                    stats.count("moves_accepted", accepted)
+                if progress:
+                    progress(done, restarts)
+                if cost[0] <= lower_bound:
+                    break
+        finally:
+            # Running restarts see the event and stop, the waiting ones are dropped
+            stop.set()
+            for future in futures:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
+            else:
+                wait(futures)
+    if stats:
+        stats.count("restarts", restarts)
+    return _pack(bin_size, boxes, best[2], best[3])
+
+def _start_state(bin_size: tuple, widths: list, heights: list, lying=False) -> tuple[list[int], list[bool]]:
+    '''
+    Returns the order and the turned boxes of the first state, the boxes by decreasing height like HBF\\
+    Boxes are turned when they only fit the bin on their side, or also when they stand and `lying` is set
+    '''
+    bin_width, bin_height = bin_size
+    turned = []
+    for w, h in zip(widths, heights):
+        fits_turned = h <= bin_width and w <= bin_height
+        turned.append(fits_turned and (w > bin_width or h > bin_height or (lying and h > w)))
+    order = sorted(range(len(widths)), key=lambda i: widths[i] if turned[i] else heights[i], reverse=True)
+    return order, turned
+
+def _search(bin_size: tuple, widths: list, heights: list, order: list[int], turned: list[bool], allow_rotation: bool,
+            seed: int, deadline: float, lower_bound: int, stop) -> tuple:
+    '''
+    Runs one restart of the simulated annealing in a worker process\\
+    Returns `(cost, order, turned, decodes, accepted)` of the best state, the cost is `(bins, load)`
+    of the state with the load of its emptiest bin, which the search tries to empty
+    '''
+    bin_width, bin_height = bin_size
+    rng = random.Random(seed)
+    n = len(order)
+    turnable = [allow_rotation and h <= bin_width and w <= bin_height and w <= bin_width and h <= bin_height
+                for w, h in zip(widths, heights)]
+    decoder = _Decoder(bin_size, widths, heights)
+    cost = decoder.decode(order, turned, 0)
+    decoder.accept()
+    best = (cost, order[:], turned[:])
+    decodes, accepted, moves = 1, 0, 0
+    start_time = time.time()
+    temperature = START_TEMPERATURE
+
+    while best[0][0] > lower_bound and n > 1:
+        # A decode can take milliseconds, so the time limit is checked before every one
+        now = time.time()
+        if now >= deadline or (moves % CHECK_INTERVAL == 0 and stop.is_set()):
+            break
+        # The temperature falls geometrically over the time limit
+        elapsed = (now - start_time) / max(deadline - start_time, 1e-9)
+        temperature = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** elapsed
+        moves += 1
+
+        k = rng.randrange(n)
+        if turnable[order[k]] and rng.random() < TURN_RATE:
+            l = None
+            turned[order[k]] = not turned[order[k]]
+        else:
+            k = min(k, n - 2)
+            l = min(n - 1, k + rng.randint(1, SWAP_DISTANCE))
+            order[k], order[l] = order[l], order[k]
+        new_cost = decoder.decode(order, turned, k)
+        decodes += 1
+
+        change = new_cost[0] - cost[0] + (new_cost[1] - cost[1]) / bin_height
+        if change <= 0 or rng.random() < math.exp(-change / temperature):
+            decoder.accept()
+            cost = new_cost
+            accepted += 1
+            if cost < best[0]:
+                best = (cost, order[:], turned[:])
+        elif l is None:
+            turned[order[k]] = not turned[order[k]]
+        else:
+            order[k], order[l] = order[l], order[k]
+    return best[0], best[1], best[2], decodes, accepted
+
+class _Decoder:
+    '''
+    Decodes the states of one search like HBF\\
+    A box goes onto the strip with the least space left that is wide and tall
+    enough for it. The spaces of the strips are kept in a sorted list with the
+    tallest strip of each space, a box bisects the list for its width and takes
+    the first space from there with a strip tall enough, so the work grows with
+    the strips and not with the bin size. The boxes come mostly by decreasing
+    height, so the first space is usually the one taken.
+    The strips of the last accepted state are kept with a copy of the strip spaces
+    before every `CHECKPOINT_STRIDE` boxes, a new state is decoded from the copy
+    before its first changed box
+    ### Values
+    - `.strip_of` - strip of the box at each position of the last decoded state
+    '''
+    def __init__(self, bin_size: tuple, widths: list, heights: list):
+        self.bin_width, self.bin_height = bin_size
+        self.widths, self.heights = widths, heights
+        self.strip_of = [0] * len(widths)
+        self.__strip_heights: list[int] = []    # Heights of the strips of the accepted state
+        # (strip count, strip spaces) before the boxes k * CHECKPOINT_STRIDE
+        self.__checkpoints: list[tuple] = [(0, [])]
+        self.__pending = None                   # Strips and checkpoints of the last decoded state
+        self.__costs: dict[tuple, tuple] = {}   # Costs of the decreasing strip heights of the last states
+
+    def decode(self, order: list[int], turned: list[bool], first: int) -> tuple:
+        '''Returns the `(bins, load)` cost of the state, which is the accepted one up to the box first'''
+        widths, heights, bin_width, strip_of = self.widths, self.heights, self.bin_width, self.strip_of
+        checkpoint = first // CHECKPOINT_STRIDE
+        checkpoints = [self.__checkpoints[checkpoint]]
+        count, spaces = checkpoints[0]
+        strip_heights = self.__strip_heights[:count]
+        spaces = spaces[:]
+        strips: dict[int, list[int]] = {}       # Strips of each space, in opening order
+        tallest: dict[int, int] = {}            # Height of the tallest strip of each space
+        for j, space in enumerate(spaces):
+            strips.setdefault(space, []).append(j)
+            if tallest.get(space, -1) < strip_heights[j]:
+                tallest[space] = strip_heights[j]
+        keys = sorted(strips)                   # Spaces with strips, increasing
+
+        for k in range(checkpoint * CHECKPOINT_STRIDE, len(order)):
+            if k % CHECKPOINT_STRIDE == 0 and k // CHECKPOINT_STRIDE > checkpoint:
+                checkpoints.append((len(strip_heights), spaces[:]))
+            i = order[k]
+            w, h = (heights[i], widths[i]) if turned[i] else (widths[i], heights[i])
+            # Least space of a strip that fits the box and is tall enough
+            position = bisect_left(keys, w)
+            while position < len(keys) and tallest[keys[position]] < h:
+                position += 1
+            if position == len(keys):
+                j = len(strip_heights)
+                strip_heights.append(h)
+                spaces.append(bin_width - w)
+            else:
+                space = keys[position]
+                same_space = strips[space]
+                for j in same_space:
+                    if strip_heights[j] >= h:
+                        break
+                same_space.remove(j)
+                if not same_space:
+                    del strips[space], tallest[space], keys[position]
+                elif strip_heights[j] == tallest[space]:
+                    tallest[space] = max([strip_heights[other] for other in same_space])
+                spaces[j] -= w
+            space = spaces[j]
+            same_space = strips.get(space)
+            if same_space is None:
+                strips[space] = [j]
+                tallest[space] = strip_heights[j]
+                insort(keys, space)
+            else:
+                insort(same_space, j)
+                if tallest[space] < strip_heights[j]:
+                    tallest[space] = strip_heights[j]
+            strip_of[k] = j
+        self.__pending = (checkpoint, checkpoints, strip_heights)
+        return self.__cost(strip_heights)
+
+    def accept(self) -> None:
+        '''Keeps the last decoded state, the next states are decoded from it'''
+        checkpoint, checkpoints, self.__strip_heights = self.__pending
+        self.__checkpoints[checkpoint:] = checkpoints
+
+    def bins(self) -> tuple[list[int], list[int]]:
+        '''Returns the heights of the strips of the last decoded state and the bin of each strip'''
+        strip_heights = self.__pending[2]
+        strips = sorted(range(len(strip_heights)), key=lambda j: strip_heights[j], reverse=True)
+        bin_of = [0] * len(strip_heights)
+        for j, i in zip(strips, self.__fill([strip_heights[j] for j in strips])[0]):
+            bin_of[j] = i
+        return strip_heights, bin_of
+
+    def __cost(self, strip_heights: list[int]) -> tuple:
+        '''Returns the bins and the load of the emptiest bin of the strips'''
+        heights = tuple(sorted(strip_heights, reverse=True))
+        cost = self.__costs.get(heights)
+        if cost is None:
+            space_left = self.__fill(heights)[1]
+            if len(self.__costs) >= COST_CACHE_SIZE:
+                self.__costs.clear()
+            cost = self.__costs[heights] = (len(space_left), self.bin_height - max(space_left))
+        return cost
+
+    def __fill(self, heights) -> tuple[list[int], list[int]]:
+        '''
+        Puts the strips of decreasing heights into bins by best fit, like __BFD of Algorithms\\
+        Returns the bin of each strip and the space left in each bin
+        '''
+        bin_space = BestFitIndex()
+        space_left, bin_of = [], []
+        for h in heights:
+            i = bin_space.best_fit(h)
+            if i is None:
+                i = bin_space.append(self.bin_height - h)
+                space_left.append(self.bin_height - h)
+            else:
+                bin_space[i] -= h
+                space_left[i] -= h
+            bin_of.append(i)
+        return bin_of, space_left
+
+def _pack(bin_size: tuple, boxes: list[Placement], order: list[int], turned: list[bool]) -> list[list[Placement]]:
+    '''Places the boxes of the state, the same way as it was decoded'''
+    bin_width, bin_height = bin_size
+    decoder = _Decoder(bin_size, [box.w for box in boxes], [box.h for box in boxes])
+    decoder.decode(order, turned, 0)
+    strip_heights, bin_of = decoder.bins()
+
+    # Strips are stacked in the bins in decreasing height, boxes are put side by side in their order
+    strip_y = [0] * len(strip_heights)
+    bin_y = [0] * (max(bin_of) + 1)
+    for j in sorted(range(len(strip_heights)), key=lambda j: strip_heights[j], reverse=True):
+        strip_y[j] = bin_y[bin_of[j]]
+        bin_y[bin_of[j]] += strip_heights[j]
+    strip_x = [0] * len(strip_heights)
+    bins: list[list[Placement]] = [[] for _ in bin_y]
+    for k, i in enumerate(order):
+        box, j = boxes[i], decoder.strip_of[k]
+        if turned[i]:
+            box.w, box.h = box.h, box.w
+        box.x, box.y = strip_x[j], strip_y[j]
+        strip_x[j] += box.w
+        bins[bin_of[j]].append(box)
+    boxes[:] = [boxes[i] for i in order]
+    return bins
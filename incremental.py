@@ -0,0 +1,262 @@
+'''
+Repair of a previous packing after the box list was edited
+
+Boxes are matched by size, so the edit is the difference of the two box
+multisets. Removed boxes leave their bins and the added boxes are put into
+the bins that lost boxes, the last bin or new bins, with the rules the
+algorithm packed them with:
+- shelf algorithms put a box on the floor of a shelf tall enough for it or
+open a new shelf on top, the bins that lost boxes close the gaps in their
+shelves and move the shelves above an emptied one down
+- bottom-left algorithms search the bin in their direction, AD alternates
+it, the bins of FBL and NBL that lost boxes are compacted towards the
+bottom-left corner
+- MaxRects and Skyline bins are rebuilt from the kept boxes and search them
+with the rule of the algorithm
+Apart from matching the boxes, the work only depends on the size of the
+edit and on the bins it touches.
+'''
+from helpers import Box, Placement
+from placement import MaxRectsBin, PackingBin, SkylineBin
+
+# How the algorithms choose a bin for a box, first-fit for the others
+FIT_RULES = {"HNF": "next", "FNF": "next", "NBL": "next", "HBF": "best"}
+# Algorithms which sort the boxes by width and by area, by height for the others
+WIDTH_SORTED = {"FBL", "NBL"}
+AREA_SORTED = {"MRBSSF", "MRBAF", "MRBL", "MRCP", "SKBL", "SKMW"}
+SHELF_ALGORITHMS = {"HFF", "HNF", "HBF", "FC", "FNF", "FFF"}
+# Bin class and rule of the MaxRects and Skyline algorithms
+BIN_RULES = {"MRBSSF": (MaxRectsBin, "short_side"), "MRBAF": (MaxRectsBin, "area"),
+             "MRBL": (MaxRectsBin, "bottom_left"), "MRCP": (MaxRectsBin, "contact"),
+             "SKBL": (SkylineBin, "bottom_left"), "SKMW": (SkylineBin, "min_waste")}
+
+def diff_boxes(bins: list[list[Placement]], boxes: list[Box]) -> tuple[list[list[Placement]], list[bool], list[Box], int]:
+    '''
+    Matches the placements of the old packing to the new boxes by size
+    ### Returns
+    `(bins, touched, added, removed)` - bins of new placements of the kept boxes,
+    which bins lost boxes, the new boxes without a placement and the number of the removed boxes
+    '''
+    by_size: dict[tuple, list[Box]] = {}
+    for box in reversed(boxes):
+        by_size.setdefault((box.w, box.h), []).append(box)
+
+    kept_bins, touched, removed = [], [], 0
+    for bin in bins:
+        kept = []
+        for p in bin:
+            same_size = by_size.get((p.box.w, p.box.h))
+            if same_size:
+                placement = Placement(same_size.pop())
+                placement.x, placement.y, placement.w, placement.h = p.x, p.y, p.w, p.h
+                kept.append(placement)
+            else:
+                removed += 1
+        kept_bins.append(kept)
+        touched.append(len(kept) != len(bin))
+    added = [box for same_size in by_size.values() for box in reversed(same_size)]
+    return kept_bins, touched, added, removed
+
+def repair(bin_size: tuple, bins: list[list[Placement]], boxes: list[Box], algorithm_name: str,
+           allow_rotation=False, progress=None) -> tuple[list[list[Placement]], int]:
+    '''
+    Repairs the old packing for the new list of boxes
+    ### Arguments
+    - `bin_size` - size of the bins, the same as for the old packing
+    - `bins` - old packing, its placements are not modified
+    - `boxes` - new list of the boxes
+    - `algorithm_name` - algorithm of the old packing, gives the fit rules and the box order
+    - `allow_rotation` - added boxes may be turned by 90 degrees
+    - `progress` - optional `progress(done, total)` callback called for every edited box
+    ### Returns
+    `(bins, edits)` - the repaired packing and the number of the added and removed boxes
+    '''
+    kept_bins, touched, added, removed = diff_boxes(bins, boxes)
+    edits = len(added) + removed
+    done = removed
+    if progress and removed:
+        progress(done, edits)
+
+    # Only the bins that lost boxes, the last bin and the new bins take the added boxes,
+    # the other bins were already closed by the algorithm
+    fit = FIT_RULES.get(algorithm_name, "first")
+    packing_bins: list = []             # Bin objects of the open bins, placements of the closed ones
+    open_bins: list[int] = []
+    for i, kept in enumerate(kept_bins):
+        if kept and (touched[i] or i == len(kept_bins) - 1):
+            open_bins.append(len(packing_bins))
+            packing_bins.append(_load_bin(bin_size, kept, algorithm_name, fit, touched[i]))
+        elif kept:
+            packing_bins.append(kept)
+
+    if algorithm_name in WIDTH_SORTED:
+        added.sort(key=lambda box: box.w, reverse=True)
+    elif algorithm_name in AREA_SORTED:
+        added.sort(key=lambda box: (box.w * box.h, box.h), reverse=True)
+    else:
+        added.sort(key=lambda box: box.h, reverse=True)
+
+    # Shelf bins are tried for a shelf of every bin before any new shelf is opened
+    passes = ({"new_shelf": False}, {"new_shelf": True}) if algorithm_name in SHELF_ALGORITHMS else ({},)
+    direction = 'left_to_right'
+    for box in added:
+        placement = Placement(box)
+        area = box.w * box.h
+        options = passes
+        if algorithm_name == "AD":
+            # Like the last phase of AD, every box goes the other way than the one before
+            options = ({"direction": direction},)
+            direction = 'right_to_left' if direction == 'left_to_right' else 'left_to_right'
+        if fit == "next":
+            candidates = open_bins[-1:]         # Only the last bin is open
+        elif fit == "first":
+            candidates = open_bins
+        else:
+            candidates = sorted(open_bins, key=lambda i: packing_bins[i].free_area) # The fullest bins first
+        target = None
+        for option in options:
+            for i in candidates:
+                # Bins with less free area than the box are skipped without a search
+                if packing_bins[i].free_area >= area and packing_bins[i].place(placement, rotate=allow_rotation,
+                                                                              **option):
+                    target = i
+                    break
+            if target is not None:
+                break
+
+        if target is None:
+            target = len(packing_bins)
+            packing_bins.append(_load_bin(bin_size, [], algorithm_name, fit, False))
+            packing_bins[target].place(placement, rotate=allow_rotation, **options[-1])
+            open_bins.append(target)
+        done += 1
+        if progress:
+            progress(done, edits)
+
+    return [packed if isinstance(packed, list) else packed.boxes for packed in packing_bins], edits
+
+def _load_bin(bin_size: tuple, placements: list[Placement], algorithm_name: str, fit: str, compact: bool):
+    '''Returns the bin object of the algorithm holding the placements, compacted if the bin lost boxes'''
+    if algorithm_name in SHELF_ALGORITHMS:
+        return _ShelfBin(bin_size, placements, fit, compact)
+    if algorithm_name in BIN_RULES:
+        bin_class, rule = BIN_RULES[algorithm_name]
+        packing_bin = bin_class(bin_size, rule)
+        # Boxes go in by the height of their tops, so the skyline of a bin is the top of its boxes
+        for p in sorted(placements, key=lambda p: p.y + p.h):
+            packing_bin.add(p)
+        return packing_bin
+    if compact and algorithm_name != "AD":
+        return _compact(bin_size, placements)
+    return _rebuild(bin_size, placements)
+
+def _rebuild(bin_size: tuple, placements: list[Placement]) -> PackingBin:
+    '''Returns the PackingBin holding the placements at their positions'''
+    packing_bin = PackingBin(bin_size)
+    for p in placements:
+        packing_bin.add(p)
+    return packing_bin
+
+def _compact(bin_size: tuple, placements: list[Placement]) -> PackingBin:
+    '''
+    Moves the placements of a bin that lost boxes towards the bottom-left corner\\
+    Placements keep their positions if any of them would have to move up or right
+    '''
+    packing_bin = PackingBin(bin_size)
+    for p in sorted(placements, key=lambda p: (p.y, p.x)):
+        position = packing_bin.find_position(p.w, p.h)
+        if position is None or (position[1], position[0]) > (p.y, p.x):
+            break
+        moved = Placement(p.box)
+        moved.x, moved.y, moved.w, moved.h = position
+        packing_bin.add(moved)
+    else:
+        return packing_bin
+    return _rebuild(bin_size, placements)
+
+class _ShelfBin:
+    '''
+    Bin of a shelf algorithm rebuilt from the positions of its placements\\
+    A shelf starts at the lowest box above the shelf below it. Boxes at the bottom
+    of a shelf are on its floor, the others hang from its ceiling like in FC.
+    A new box goes on the floor after the floor boxes and left of the ceiling boxes
+    it would meet, in the shelf chosen by the fit rule, or on a new shelf on top
+    ### Values
+    - `.boxes` - list of the placements in the bin
+    - `.free_area` - area of the bin not covered by the boxes
+    '''
+    def __init__(self, bin_size: tuple, placements: list[Placement], fit: str, compact=False):
+        self.size = bin_size
+        self.boxes = list(placements)
+        self.free_area = bin_size[0] * bin_size[1] - sum(p.w * p.h for p in placements)
+        self.__fit = fit
+        self.__shelves: list[list] = []     # [y, height, floor boxes, ceiling boxes] from the bottom up
+        for p in sorted(placements, key=lambda p: (p.y, -p.h)):
+            if not self.__shelves or p.y >= self.__shelves[-1][0] + self.__shelves[-1][1]:
+                self.__shelves.append([p.y, p.h, [], []])
+            shelf = self.__shelves[-1]
+            shelf[2 if p.y == shelf[0] else 3].append(p)
+            shelf[1] = max(shelf[1], p.y + p.h - shelf[0])
+        if compact:
+            self.__compact()
+
+    def place(self, box: Box, rotate=False, new_shelf=True) -> bool:
+        '''
+        Puts the box on the floor of a shelf chosen by the fit rule, or with new_shelf on a new shelf
+        on top of the bin, and sets its position\\
+        Returns False if it does not fit
+        '''
+        sizes = [(box.w, box.h), (box.h, box.w)] if rotate and box.w != box.h else [(box.w, box.h)]
+        if new_shelf:
+            top = self.__shelves[-1][0] + self.__shelves[-1][1] if self.__shelves else 0
+            for w, h in sizes:
+                if w <= self.size[0] and top + h <= self.size[1]:
+                    self.__shelves.append([top, h, [], []])
+                    return self.__put(box, self.__shelves[-1], w, h)
+            return False
+
+        shelves = self.__shelves[-1:] if self.__fit == "next" else self.__shelves
+        best = None
+        for shelf in shelves:
+            for w, h in sizes:
+                left = self.__width_left(shelf, h) - w
+                if h <= shelf[1] and left >= 0:
+                    if best is None or left < best[0]:
+                        best = (left, shelf, w, h)
+                    break
+            if best and self.__fit != "best":
+                break
+        if best is None:
+            return False
+        return self.__put(box, *best[1:])
+
+    def __put(self, box: Box, shelf: list, w, h) -> bool:
+        box.x, box.y, box.w, box.h = max((p.x + p.w for p in shelf[2]), default=0), shelf[0], w, h
+        shelf[2].append(box)
+        self.boxes.append(box)
+        self.free_area -= w * h
+        return True
+
+    def __width_left(self, shelf: list, h) -> int:
+        '''Returns the floor width left on the shelf for a box of height h'''
+        end = max((p.x + p.w for p in shelf[2]), default=0)
+        limit = min((p.x for p in shelf[3] if p.y < shelf[0] + h), default=self.size[0])
+        return limit - end
+
+    def __compact(self) -> None:
+        '''
+        Closes the gaps between the floor boxes of the shelves without ceiling boxes
+        and moves every shelf down onto the one below it
+        '''
+        y = 0
+        for shelf in self.__shelves:
+            if not shelf[3]:
+                x = 0
+                for p in sorted(shelf[2], key=lambda p: p.x):
+                    p.x = x
+                    x += p.w
+            if shelf[0] != y:
+                for p in shelf[2] + shelf[3]:
+                    p.y -= shelf[0] - y
+                shelf[0] = y
+            y += shelf[1]
@@ -1,9 +1,18 @@
+import os
+import queue
 import random
-import tkinter as tk
+import shutil
+import tempfile
+import threading
 import time
+import tkinter as tk
+from tkinter import filedialog, ttk
 
 from helpers import *
 from algorithms import Algorithms
+from cache import ResultCache
+from rendering import BinRenderer
+from resultfile import ResultFile, write_result
 import matplotlib.colors as mcolors
 
 class BinPackingApp:
@@ -11,7 +20,7 @@ class BinPackingApp:
     def __init__(self):
         
         self.canvas = None
-        self.bss = BoxStackingSolver() # Create the main solver
+        self.bss = BoxStackingSolver(ResultCache()) # Create the main solver, repeated runs come from the cache
         self.master = tk.Tk()
         self.num = 0
         self.new_windows = []
@@ -62,6 +71,10 @@ class BinPackingApp:
         self.bin_size_entry.insert(0,"20x15")
         self.bin_size_entry.grid(row=5, column=0, columnspan=3)
 
+        tk.Label(self.box_gen_inputs_frame, text="Seed (empty for random):").grid(row = 6, column = 0, columnspan=2)
+        self.seed_entry: tk.Entry = tk.Entry(self.box_gen_inputs_frame)
+        self.seed_entry.grid(row=6, column=2)
+
         # Buttons and others
         self.gen_boxes_button = tk.Button(self.inputs_frame,
             text="Generate Boxes",
@@ -82,11 +95,34 @@ class BinPackingApp:
             checkbox = tk.Checkbutton(self.inputs_frame, text=algorithm_name, variable=var, onvalue=True, offvalue=False)
             checkbox.pack()
 
+        self.rotation_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.inputs_frame, text="Allow rotation", variable=self.rotation_var,
+                       onvalue=True, offvalue=False).pack(pady=5)
+
         self.run_solver_button = tk.Button(self.inputs_frame,
             text="Run Solver",
             command= self.run_solver)
         self.run_solver_button.pack(pady=5)
 
+        self.cancel_button = tk.Button(self.inputs_frame,
+            text="Cancel",
+            command= self.cancel_solver,
+            state=tk.DISABLED)
+        self.cancel_button.pack()
+
+        self.open_result_button = tk.Button(self.inputs_frame,
+            text="Open Result",
+            command= self.open_result)
+        self.open_result_button.pack(pady=5)
+
+        self.progress_bar = ttk.Progressbar(self.inputs_frame, orient=tk.HORIZONTAL, maximum=100)
+        self.progress_bar.pack(pady=5)
+
+        # Solving runs in a worker thread which reports back through the queue
+        self.solver_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.solver_thread = None
+
         tk.Label(self.inputs_frame, text="Output:").pack()
         self.output_label = tk.Label(self.inputs_frame, text="")
         self.output_label.pack()
@@ -103,7 +139,8 @@ class BinPackingApp:
                 int(self.max_box_width_entry.get()),
                 int(self.min_box_height_entry.get()),
                 int(self.max_box_height_entry.get()),
-                int(self.num_of_boxes_entry.get()))
+                int(self.num_of_boxes_entry.get()),
+                int(self.seed_entry.get()) if self.seed_entry.get().strip() else None)
             self.boxes_text.delete('1.0', tk.END)
             self.boxes_text.insert(1.0, self.bss.get_boxes_text())
             self.output_label.config(text="Generated boxes", bg="green")
@@ -112,6 +149,8 @@ class BinPackingApp:
             self.output_label.config(text=err, bg="red")
 
     def run_solver(self):
+        if self.solver_thread is not None:
+            return
 
         for window in self.new_windows:
             window.destroy()
@@ -119,130 +158,184 @@ class BinPackingApp:
 
         try:
             self.bss.update_bin_size(self.bin_size_entry.get())
-            self.bss.update_boxes_from_txt(self.boxes_text.get("1.0", tk.END))
-
-            selected_algorithms = [name for name, var in zip(Algorithms.get_implemented_names(), self.algorithm_vars) if var.get()]
-
-            for algorithm_name in selected_algorithms:
-                algorithm_function = getattr(Algorithms, algorithm_name)
-                start_time = time.time()
-                bins = algorithm_function(self.bss.bin_size, self.bss.boxes)
-                end_time = time.time()
-                elapsed_time = end_time - start_time
-
-                # New window for each algorithm
-                new_window = tk.Toplevel(self.master)
-                self.new_windows.append(new_window)
-
-                width = self.master.winfo_screenwidth()
-                height = self.master.winfo_screenheight()
-                new_window.geometry('%dx%d' % (width, height))
-
-                tk.Label(new_window, text=algorithm_name).pack()
-                scrollbar_vertical = tk.Scrollbar(new_window, orient=tk.VERTICAL)
-                scrollbar_vertical.pack(side=tk.RIGHT, fill=tk.Y)
-                scrollbar_horizontal = tk.Scrollbar(new_window, orient=tk.HORIZONTAL)
-                scrollbar_horizontal.pack(side=tk.BOTTOM, fill=tk.X)
-                canvas = tk.Canvas(new_window, width=width, height=height, bg='white',
-                                   yscrollcommand=scrollbar_vertical.set, xscrollcommand=scrollbar_horizontal.set)
-                canvas.pack(fill=tk.BOTH, expand=True)
-                scrollbar_vertical.config(command=canvas.yview)
-                scrollbar_horizontal.config(command=canvas.xview)
-
-                # Draw bins for the current algorithm
-                self.draw_bins(canvas, bins, bin_size=self.bss.bin_size, algorithm_name=algorithm_name,
-                               computing_time=elapsed_time)
-
-                canvas.update_idletasks()
-                canvas.config(scrollregion=canvas.bbox("all"))
-
-            self.output_label.config(text="Solved successfully", bg="green")
+            self.bss.update_boxes_from_txt(self.boxes_text.get("1.0", tk.END), self.rotation_var.get())
         except ValidationError as err:
             print(f"Exception: {err}")
             self.output_label.config(text=err, bg="red")
+            return
 
-    def draw_bins(self, canvas, bins, bin_size, algorithm_name, computing_time):
-        canvas.create_text(0,0, text=".",font=('Arial', 1, 'bold')) # Text to stop the canvas from cutting the left margin
-        canvas_width = self.master.winfo_screenwidth()
-        scale = 10.2 * canvas_width/2560
-        bin_offset = scale * 1.1 * bin_size[0]
-        bin_y_offset = scale * 1.1 * bin_size[1]
-
-        list_of_colors = list(mcolors.CSS4_COLORS.values())
-
-        x_offset = (canvas_width - (11*bin_offset))/2
-        y_text_offset = 40
-
-        num_rows = ((len(bins) - len(bins) % 11) / 11 + 1)
-        total_bins_height = num_rows * (bin_y_offset + 50)
-
-        canvas.config(scrollregion=(0, 0, canvas.winfo_width(), canvas.winfo_height()))
-        # Adjust canvas height if the total bins height exceeds current canvas height
-        if total_bins_height > canvas.winfo_height():
-            canvas.config(scrollregion=(0, 0, canvas.winfo_width(), total_bins_height))
-
-        bin_row_x_offset = x_offset
-        box_fill_lvl = []
-
-        # Choose the color of the box size text depending on the bg
-        def get_luminance(hex_color):
-            colour = hex_color[1:]
-            hex_red = int(colour[0:2], base=16)
-            hex_green = int(colour[2:4], base=16)
-            hex_blue = int(colour[4:6], base=16)
-
-            return hex_red * 0.2126 + hex_green * 0.7152 + hex_blue * 0.0722
-
-        for bin_idx, bin in enumerate(bins):
-            number_of_col = 0
-            if bin_row_x_offset + bin_offset > canvas_width:
-                bin_row_x_offset = x_offset
-                y_text_offset += bin_y_offset + 30
-
-            for box_idx, box in enumerate(bin):
-                fill = list_of_colors[number_of_col]
-                fill = str(fill)
-                x0 = box.x * scale + bin_row_x_offset
-                y0 = box.y * scale + y_text_offset
-                x1 = x0 + box.w * scale
-                y1 = y0 + box.h * scale
-
-                box_field = box.w * box.h
-                box_fill_lvl.append(box_field)
-
-                if get_luminance(fill) <= 140:
-                    color = 'white'
-                else:
-                    color = 'black'
+        selected_algorithms = [name for name, var in zip(Algorithms.get_implemented_names(), self.algorithm_vars) if var.get()]
 
-                canvas.create_rectangle(x0, y0, x1, y1, outline='red', fill=fill)
-                if box.w < 3:
-                    canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2,
-                                       text=f'{box.w}x{box.h}', font=('Arial', 8), angle=90, fill = color)
-                else:
-                    canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2, text=f'{box.w}x{box.h}',
-                                       font=('Arial', 8), fill = color)
-                if number_of_col <= 146:
-                    number_of_col += 1
+        self.cancel_event.clear()
+        self.progress_bar['value'] = 0
+        self.run_solver_button.config(state=tk.DISABLED)
+        self.gen_boxes_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.output_label.config(text="Solving...", bg="yellow")
+
+        self.solver_thread = threading.Thread(target=self.solver_worker,
+                                              args=(selected_algorithms, self.rotation_var.get()), daemon=True)
+        self.solver_thread.start()
+        self.master.after(50, self.poll_solver)
+
+    def cancel_solver(self):
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+
+    def solver_worker(self, algorithm_names, allow_rotation=False):
+        '''Runs the algorithms one by one, runs outside of the Tk thread'''
+        try:
+            bound = self.bss.lower_bound(allow_rotation)
+            for i, algorithm_name in enumerate(algorithm_names):
+                last_percent = -1
+
+                def progress(done, total):
+                    nonlocal last_percent
+                    if self.cancel_event.is_set():
+                        raise SolveCancelled()
+                    percent = done * 100 // total
+                    if percent != last_percent: # Do not flood the queue with every box
+                        last_percent = percent
+                        self.solver_queue.put(("progress", algorithm_name, i, len(algorithm_names), percent))
+
+                start_time = time.perf_counter()
+                # Edits of the boxes repair the previous packing instead of solving again
+                order = []
+                bins = self.bss.solve_incremental(getattr(Algorithms, algorithm_name), progress=progress,
+                                                  allow_rotation=allow_rotation, order=order)
+                elapsed_time = time.perf_counter() - start_time
+                result = SolveResult(algorithm_name, bins, self.bss.bin_size, elapsed_time, lower_bound=bound,
+                                     order=order)
+                # The result is replayed from a temporary result file, it can be saved from its window
+                file, path = tempfile.mkstemp(suffix=".bpr")
+                os.close(file)
+                write_result(path, self.bss.bin_size, result, self.bss.boxes)
+                self.solver_queue.put(("result", result, path))
+            self.solver_queue.put(("done",))
+        except SolveCancelled:
+            self.solver_queue.put(("cancelled",))
+        except Exception as err:
+            self.solver_queue.put(("error", err))
+
+    def poll_solver(self):
+        '''Handles the messages from the solver thread, runs in the Tk thread'''
+        try:
+            while True:
+                message = self.solver_queue.get_nowait()
+                if message[0] == "progress":
+                    _, algorithm_name, i, count, percent = message
+                    self.progress_bar['value'] = percent
+                    self.output_label.config(text=f"Solving {algorithm_name} ({i + 1}/{count})", bg="yellow")
+                elif message[0] == "result":
+                    self.show_result(message[1], message[2])
                 else:
-                    number_of_col = 0
-                print()
-
-            # Draw a rectangle for each bin
-            canvas.create_rectangle(
-                bin_row_x_offset,
-                y_text_offset,
-                bin_row_x_offset + bin_size[0] * scale,
-                bin_size[1] * scale + y_text_offset,
-                outline='black')
-
-            bin_row_x_offset += bin_offset
-
-        fill_percentage = sum(box_fill_lvl)*100 / ((bin_size[0] * bin_size[1]) * len(bins))
-        canvas.create_text(canvas_width/2, 20,
-                                text=f'{algorithm_name}, Computing time: {computing_time:.4f}s, '
-                                f'Number of bins used: {len(bins)}, Packing efficiency {fill_percentage:.2f}% ',
-                                font=('Arial', 16, 'bold'))
+                    self.finish_solver(message)
+                    return
+        except queue.Empty:
+            pass
+        self.master.after(50, self.poll_solver)
+
+    def finish_solver(self, message):
+        self.solver_thread = None
+        self.run_solver_button.config(state=tk.NORMAL)
+        self.gen_boxes_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if message[0] == "done":
+            self.progress_bar['value'] = 100
+            self.output_label.config(text="Solved successfully", bg="green")
+        elif message[0] == "cancelled":
+            self.output_label.config(text="Solving cancelled", bg="orange")
+        else:
+            print(f"Exception: {message[1]}")
+            self.output_label.config(text=message[1], bg="red")
+
+    def open_result(self):
+        path = filedialog.askopenfilename(filetypes=[("Result files", "*.bpr"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            replay = ResultFile(path)
+        except (OSError, ValidationError) as err:
+            print(f"Exception: {err}")
+            self.output_label.config(text=err, bg="red")
+            return
+        self.show_replay(replay, f'{os.path.basename(path)}, {replay.algorithm}, '
+                                 f'Number of bins used: {replay.bin_count}')
+
+    def show_result(self, result: SolveResult, path: str):
+        gap = f', Gap to the lower bound {result.gap:.2%}' if result.gap is not None else ''
+        self.show_replay(ResultFile(path), f'{result.name}, Computing time: {result.time:.4f}s, '
+                                           f'Number of bins used: {result.bin_count}, '
+                                           f'Packing efficiency {result.fill * 100:.2f}%{gap}', temporary=True)
+
+    def show_replay(self, replay: ResultFile, title: str, temporary=False):
+        '''Opens a window with the bins of the result file and a slider over the packing steps'''
+        # New window for each algorithm
+        new_window = tk.Toplevel(self.master)
+        self.new_windows.append(new_window)
+
+        width = self.master.winfo_screenwidth()
+        height = self.master.winfo_screenheight()
+        new_window.geometry('%dx%d' % (width, height))
+
+        tk.Label(new_window, text=title, font=('Arial', 16, 'bold')).pack()
+        controls = tk.Frame(new_window)
+        controls.pack(side=tk.BOTTOM, fill=tk.X)
+        scrollbar_vertical = tk.Scrollbar(new_window, orient=tk.VERTICAL)
+        scrollbar_vertical.pack(side=tk.RIGHT, fill=tk.Y)
+        scrollbar_horizontal = tk.Scrollbar(new_window, orient=tk.HORIZONTAL)
+        scrollbar_horizontal.pack(side=tk.BOTTOM, fill=tk.X)
+        canvas = tk.Canvas(new_window, width=width, height=height, bg='white',
+                           yscrollcommand=scrollbar_vertical.set, xscrollcommand=scrollbar_horizontal.set)
+        canvas.pack(fill=tk.BOTH, expand=True)
+
+        # Only the bins in the view are drawn, scrolling and resizing draw the new ones
+        step = len(replay)
+        renderer = BinRenderer(canvas, replay.bins(step), replay.bin_size, list(mcolors.CSS4_COLORS.values()))
+        scrollbar_vertical.config(command=renderer.yview)
+        scrollbar_horizontal.config(command=renderer.xview)
+        canvas.bind("<Configure>", lambda event: renderer.render())
+
+        def scroll(event):
+            steps = -1 if event.num == 4 or event.delta > 0 else 1
+            if event.state & 0x4:   # Control zooms
+                renderer.zoom(1.25 if steps < 0 else 0.8)
+            else:
+                renderer.yview("scroll", steps, "units")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            canvas.bind(sequence, scroll)
+
+        # Moving the slider redraws only the visible bins which got or lost a box
+        def seek(value):
+            nonlocal step
+            changed = replay.changed_bins(step, int(value))
+            step = int(value)
+            renderer.bins = replay.bins(step)
+            renderer.redraw(changed)
+
+        def save():
+            path = filedialog.asksaveasfilename(parent=new_window, defaultextension=".bpr",
+                                                filetypes=[("Result files", "*.bpr")])
+            if path:
+                shutil.copyfile(replay.path, path)
+
+        def close(event):
+            if event.widget is not new_window:
+                return
+            replay.close()
+            if temporary:
+                try:
+                    os.remove(replay.path)
+                except OSError:
+                    pass
+
+        tk.Button(controls, text="Save Result", command=save).pack(side=tk.RIGHT, padx=5)
+        tk.Label(controls, text="Step:").pack(side=tk.LEFT)
+        slider = tk.Scale(controls, from_=0, to=len(replay), orient=tk.HORIZONTAL, command=seek)
+        slider.set(step)
+        slider.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        new_window.bind("<Destroy>", close)
+        renderer.render()
 
 def main():
     app = BinPackingApp()
@@ -0,0 +1,168 @@
+'''
+Online packing of boxes which arrive one at a time
+
+    packer = OnlinePacker((1200, 800), policy='first')
+    bin_id, x, y = packer.add(box)
+
+Unlike `Algorithms`, the boxes cannot be sorted by height, so every box is
+put on a shelf of its height class. Class heights are the bin height times
+powers of `ratio`, so a box takes at least `ratio` of its shelf height and
+the shelves of one class can be filled like the strips of `__NFDH`,
+`__FFDH` and `__BFDH`.
+'''
+import math
+from bisect import bisect_left
+from helpers import Box, ValidationError
+from structures import BestFitIndex, FirstFitIndex
+
+POLICIES = ("next", "first", "best")
+
+class OnlinePacker:
+    '''
+    Packs boxes as they arrive into bins of the given size
+    ### Arguments
+    - `bin_size` - `(width, height)` of the bins
+    - `policy` - 'next', 'first' or 'best', how shelves and bins are chosen
+    - `ratio` - ratio of two following shelf height classes, between 0 and 1
+    ### Values
+    - `.bin_size` - size of the bins
+    - `.policy` - the chosen policy
+    '''
+    def __init__(self, bin_size: tuple, policy='first', ratio=0.7):
+        if policy not in POLICIES:
+            raise ValidationError(f"Unknown packing policy {policy}", "policy")
+        if not 0 < ratio < 1:
+            raise ValidationError("Shelf height ratio must be between 0 and 1", "ratio")
+        self.bin_size = bin_size
+        self.policy = policy
+        bin_width, bin_height = bin_size
+
+        # Shelf heights of the classes, increasing
+        heights = set()
+        height = bin_height
+        while height > 1:
+            heights.add(math.ceil(round(height, 6)))
+            height *= ratio
+        self.__class_heights = sorted(heights | {1})
+
+        self.__bins: list[list[Box]] = []
+        self.__open: list[bool] = []
+        self.__bin_shelves: list[list[tuple]] = []  # (class, shelf) of the shelves of each bin
+
+        # Shelves of each class
+        self.__shelf_bin = [[] for _ in self.__class_heights]
+        self.__shelf_y = [[] for _ in self.__class_heights]
+        self.__shelf_x = [[] for _ in self.__class_heights]
+        if policy == "next":
+            self.__shelf_space = None
+            self.__bin_space = None
+        elif policy == "first":
+            self.__shelf_space = [FirstFitIndex() for _ in self.__class_heights]
+            self.__bin_space = FirstFitIndex()
+        else:
+            self.__shelf_space = [BestFitIndex() for _ in self.__class_heights]
+            self.__bin_space = BestFitIndex()
+        self.__bin_heights: list[int] = []  # Height left in each bin
+
+    def __len__(self):
+        return len(self.__bins)
+
+    def add(self, box: Box) -> tuple:
+        '''
+        Places the box and sets its position
+        ### Returns
+        `(bin_id, x, y)` of the box
+        '''
+        bin_width, bin_height = self.bin_size
+        if box.w > bin_width or box.h > bin_height:
+            raise ValidationError(f"Box {box.w}x{box.h} is bigger than the bin", "box_size")
+
+        c = bisect_left(self.__class_heights, box.h)
+        shelf = self.__find_shelf(c, box.w)
+        if shelf is None:
+            shelf = self.__open_shelf(c)
+
+        bin_id = self.__shelf_bin[c][shelf]
+        box.x, box.y = self.__shelf_x[c][shelf], self.__shelf_y[c][shelf]
+        self.__shelf_x[c][shelf] += box.w
+        if self.__shelf_space is not None:
+            self.__shelf_space[c][shelf] = bin_width - self.__shelf_x[c][shelf]
+        self.__bins[bin_id].append(box)
+        return bin_id, box.x, box.y
+
+    def close_bin(self, bin_id=None) -> list[Box]:
+        '''
+        Closes the bin so no more boxes are put into it
+        ### Arguments
+        - `bin_id` - the bin to close, the last opened one by default
+        ### Returns
+        Boxes of the closed bin
+        '''
+        if bin_id is None:
+            bin_id = len(self.__bins) - 1
+        if not 0 <= bin_id < len(self.__bins):
+            raise ValidationError(f"Unknown bin {bin_id}", "bin_id")
+        if self.__open[bin_id]:
+            self.__open[bin_id] = False
+            self.__bin_heights[bin_id] = 0
+            if self.__bin_space is not None:
+                self.__bin_space[bin_id] = 0
+            for c, shelf in self.__bin_shelves[bin_id]:
+                self.__shelf_x[c][shelf] = self.bin_size[0]
+                if self.__shelf_space is not None:
+                    self.__shelf_space[c][shelf] = 0
+        return self.__bins[bin_id]
+
+    def snapshot(self) -> list[list[Box]]:
+        '''Returns the boxes of every bin so far, closed bins included'''
+        return [list(boxes) for boxes in self.__bins]
+
+    def __find_shelf(self, c, width):
+        '''Returns a shelf of the class with enough width left or None'''
+        if self.policy == "next":
+            # Only the last shelf of the class is used
+            shelves = self.__shelf_x[c]
+            if shelves and shelves[-1] + width <= self.bin_size[0]:
+                return len(shelves) - 1
+            return None
+        if self.policy == "first":
+            return self.__shelf_space[c].first_fit(width)
+        return self.__shelf_space[c].best_fit(width)
+
+    def __open_shelf(self, c) -> int:
+        '''Opens a new shelf of the class, in a new bin if needed, and returns its index'''
+        height = self.__class_heights[c]
+        if self.policy == "next":
+            # Only the last bin gets new shelves
+            bin_id = len(self.__bins) - 1
+            if bin_id < 0 or self.__bin_heights[bin_id] < height:
+                bin_id = None
+        elif self.policy == "first":
+            bin_id = self.__bin_space.first_fit(height)
+        else:
+            bin_id = self.__bin_space.best_fit(height)
+        if bin_id is None:
+            bin_id = self.__open_bin()
+
+        y = self.bin_size[1] - self.__bin_heights[bin_id]
+        self.__bin_heights[bin_id] -= height
+        if self.__bin_space is not None:
+            self.__bin_space[bin_id] = self.__bin_heights[bin_id]
+
+        self.__shelf_bin[c].append(bin_id)
+        self.__shelf_y[c].append(y)
+        self.__shelf_x[c].append(0)
+        if self.__shelf_space is not None:
+            self.__shelf_space[c].append(self.bin_size[0])
+        shelf = len(self.__shelf_x[c]) - 1
+        self.__bin_shelves[bin_id].append((c, shelf))
+        return shelf
+
+    def __open_bin(self) -> int:
+        self.__bins.append([])
+        self.__open.append(True)
+        self.__bin_shelves.append([])
+        self.__bin_heights.append(self.bin_size[1])
+        if self.__bin_space is not None:
+            self.__bin_space.append(self.bin_size[1])
+        return len(self.__bins) - 1
@@ -0,0 +1,601 @@
+from bisect import bisect_left, bisect_right
+from helpers import Box
+from structures import FailedSizes
+
+class OccupancyIndex:
+    '''
+    Occupied cells of a bin on the grid made by the edges of its boxes\\
+    The x and y of the box edges cut the bin into cells, rows and columns of
+    cells are kept as integer bitsets in two segment trees, so a whole band of
+    the bin is checked in O(log n). Memory and time depend on the number of the
+    boxes, not on the size of the bin
+    ### Arguments
+    - `bin_size` - (width, height) of the bin, positions must be integers
+    '''
+    def __init__(self, bin_size: tuple):
+        self.__xs = [0, bin_size[0]]    # Sorted edges of the columns of cells
+        self.__ys = [0, bin_size[1]]    # Sorted edges of the rows of cells
+        self.__rows = _BandTree(1)      # Bit i of the row j is set if the cell (i, j) is occupied
+        self.__cols = _BandTree(1)      # Bit j of the column i is set if the cell (i, j) is occupied
+
+    def add(self, x0, y0, x1, y1) -> None:
+        '''Marks the rectangle between (x0, y0) and (x1, y1) as occupied'''
+        for x in (x0, x1):
+            self.__split(self.__xs, x, self.__cols, self.__rows)
+        for y in (y0, y1):
+            self.__split(self.__ys, y, self.__rows, self.__cols)
+        i0, i1 = bisect_left(self.__xs, x0), bisect_left(self.__xs, x1)
+        j0, j1 = bisect_left(self.__ys, y0), bisect_left(self.__ys, y1)
+        self.__rows.add(j0, j1, ((1 << (i1 - i0)) - 1) << i0)
+        self.__cols.add(i0, i1, ((1 << (j1 - j0)) - 1) << j0)
+
+    def overlaps(self, x0, y0, x1, y1) -> bool:
+        '''Checks if any cell of the rectangle between (x0, y0) and (x1, y1) is occupied'''
+        i0, i1 = self.__cells(self.__xs, x0, x1)
+        j0, j1 = self.__cells(self.__ys, y0, y1)
+        return bool(self.__rows.query(j0, j1) & (((1 << (i1 - i0)) - 1) << i0))
+
+    def row_gap(self, y0, y1, length):
+        '''Returns the lowest x of a free gap in the rows between y0 and y1 or None'''
+        return self.__lowest_run(self.__rows.query(*self.__cells(self.__ys, y0, y1)), length, self.__xs)
+
+    def column_gap(self, x0, x1, length):
+        '''Returns the lowest y of a free gap in the columns between x0 and x1 or None'''
+        return self.__lowest_run(self.__cols.query(*self.__cells(self.__xs, x0, x1)), length, self.__ys)
+
+    def row_gaps(self, y, sizes):
+        '''
+        Returns the lowest (x, w, h) where one of the (w, h) sizes fits on the row y or None\\
+        The band of each size grows the band of the lower one, so a band without
+        a gap for the narrowest size ends the search early
+        '''
+        return self.__gaps(self.__rows, self.__ys, self.__xs, y, [(w, h) for w, h in sizes], False)
+
+    def column_gaps(self, x, sizes):
+        '''Returns the lowest (y, w, h) where one of the (w, h) sizes fits on the column x or None'''
+        return self.__gaps(self.__cols, self.__xs, self.__ys, x, [(h, w) for w, h in sizes], True)
+
+    @staticmethod
+    def __gaps(tree, lines, edges, start, sizes, swap):
+        '''Searches the gaps for (length, depth) sizes, bands start at start and go depth deep'''
+        sizes.sort(key=lambda s: s[1])
+        narrowest = min(length for length, _ in sizes)
+        found = None
+        last = bisect_right(lines, start) - 1
+        bits = 0
+        for length, depth in sizes:
+            end = bisect_left(lines, start + depth)
+            if end > last:
+                bits |= tree.query(last, end)
+                last = end
+            if OccupancyIndex.__lowest_run(bits, narrowest, edges) is None:
+                break # Deeper bands only have more occupied cells
+            position = OccupancyIndex.__lowest_run(bits, length, edges)
+            if position is not None and (found is None or position < found[0]):
+                found = (position, depth, length) if swap else (position, length, depth)
+        return found
+
+    @staticmethod
+    def __cells(edges, start, end) -> tuple:
+        '''Returns the range of the cells between the edges overlapping start to end'''
+        return bisect_right(edges, start) - 1, bisect_left(edges, end)
+
+    @staticmethod
+    def __split(edges, edge, lines, cells) -> None:
+        '''Adds the edge, the cell it cuts becomes two copies of itself in both trees'''
+        i = bisect_left(edges, edge)
+        if edges[i] == edge:
+            return
+        edges.insert(i, edge)
+        lines.split_line(i - 1)
+        cells.split_bit(i - 1)
+
+    @staticmethod
+    def __lowest_run(occupied, length, edges):
+        '''Returns the lowest edge starting a run of free cells at least length long or None'''
+        free = ~occupied & ((1 << (len(edges) - 1)) - 1)
+        while free:
+            start = (free & -free).bit_length() - 1
+            run = free >> start
+            end = start + ((run + 1) & ~run).bit_length() - 1  # First occupied cell after the run
+            if edges[end] - edges[start] >= length:
+                return edges[start]
+            free &= ~((1 << end) - 1)
+        return None
+
+class _BandTree:
+    '''Segment tree answering the OR of the bitsets of a band of lines'''
+    def __init__(self, lines):
+        self.lines = lines
+        self.size = 1
+        while self.size < lines:
+            self.size *= 2
+        self.any = [0] * (2 * self.size)    # OR of every line below the node
+        self.all = [0] * (2 * self.size)    # Bits set on every line below the node
+
+    def add(self, start, end, bits) -> None:
+        '''Sets the bits on every line between start and end'''
+        lo, hi = start + self.size, end + self.size
+        while lo < hi:
+            if lo & 1:
+                self.all[lo] |= bits
+                self.any[lo] |= bits
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                self.all[hi] |= bits
+                self.any[hi] |= bits
+            lo >>= 1
+            hi >>= 1
+        for leaf in (start + self.size, end - 1 + self.size):
+            leaf >>= 1
+            while leaf:
+                self.any[leaf] |= bits
+                leaf >>= 1
+
+    def query(self, start, end) -> int:
+        '''Returns the OR of the lines between start and end'''
+        bits = 0
+        lo, hi = start + self.size, end + self.size
+        while lo < hi:
+            if lo & 1:
+                bits |= self.any[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                bits |= self.any[hi]
+            lo >>= 1
+            hi >>= 1
+        for leaf in (start + self.size, end - 1 + self.size):
+            leaf >>= 1
+            while leaf:
+                bits |= self.all[leaf]
+                leaf >>= 1
+        return bits
+
+    def split_line(self, i) -> None:
+        '''Repeats the line i after itself, the tree is rebuilt over the lines'''
+        # Bits set on a node hold for every line below it
+        everywhere = self.all[:]
+        for node in range(1, self.size):
+            everywhere[2 * node] |= everywhere[node]
+            everywhere[2 * node + 1] |= everywhere[node]
+        lines = everywhere[self.size:self.size + self.lines]
+        lines.insert(i, lines[i])
+        self.__init__(len(lines))
+        size = self.size
+        self.any[size:size + len(lines)] = lines
+        self.all[size:size + len(lines)] = lines
+        for node in range(size - 1, 0, -1):
+            self.any[node] = self.any[2 * node] | self.any[2 * node + 1]
+
+    def split_bit(self, i) -> None:
+        '''Repeats the bit i after itself in every bitset'''
+        low = (1 << (i + 1)) - 1
+        self.any = [bits & low | bits >> i << (i + 1) for bits in self.any]
+        self.all = [bits & low | bits >> i << (i + 1) for bits in self.all]
+
+class PackingBin:
+    '''
+    Single bin used by the bottom-left family of algorithms\\
+    Instead of testing every pixel of the bin only the corner points
+    made by the already placed boxes are tested
+    Bins only get fuller, so the sizes which did not fit are remembered and
+    a box at least as big in both sides is rejected without a search
+    ### Values
+    - `.size` - (width, height) of the bin
+    - `.boxes` - list of the boxes placed in the bin
+    - `.free_area` - area of the bin not covered by the boxes
+    - `.free_space` - `(sizes, area)` of the free space for SpaceIndex, only the whole bin and the free area
+    ### Arguments
+    - `bin_size` - (width, height) of the bin
+    - `stats` - optional SolveStats counting the searches and candidates
+    '''
+    def __init__(self, bin_size: tuple, stats=None):
+        self.size = bin_size
+        self.boxes: list[Box] = []
+        self.free_area = bin_size[0] * bin_size[1]
+        self.__stats = stats
+        self.__index = OccupancyIndex(bin_size)
+        self.__failed = FailedSizes()
+        self.__tops = [0]           # Sorted y where a new box can rest on
+        self.__rights = [0]         # Sorted x where a new box can start on the left side
+        self.__lefts = []           # Sorted x where a new box can end on the right side
+
+    @property
+    def free_space(self) -> tuple:
+        return [self.size], self.free_area
+
+    def place(self, box: Box, direction='bottom', rotate=False) -> bool:
+        '''
+        Finds the position for the box and adds it to the bin
+        ### Arguments
+        - `box` - box to be placed, its position is updated on success
+        - `direction` - 'bottom', 'left_to_right' or 'right_to_left'
+        - `rotate` - the box may be turned by 90 degrees, its size is swapped then
+        '''
+        position = self.find_position(box.w, box.h, direction, rotate)
+        if position is None:
+            return False
+        box.x, box.y, box.w, box.h = position
+        self.add(box)
+        return True
+
+    def find_position(self, w, h, direction='bottom', rotate=False):
+        '''
+        Returns the first free (x, y, w, h) for the box of size w x h or None\\
+        Gives the same result as scanning the whole bin:
+        - `'bottom'` - the lowest row, then the leftmost column
+        - `'left_to_right'` - the leftmost column, then the lowest row
+        - `'right_to_left'` - the rightmost column, then the lowest row
+
+        With `rotate` both orientations are tested at each candidate in a single
+        pass, so the search stops at the first candidate either of them fits
+        '''
+        sizes = [(w, h), (h, w)] if rotate and w != h else [(w, h)]
+        # Every direction searches the whole bin, so a failure holds for all of them
+        sizes = [(w, h) for w, h in sizes if not self.__failed.covers(w, h)]
+        if not sizes:
+            if self.__stats:
+                self.__stats.count("pruned_searches")
+            return None
+        position, candidates = self.__search(sizes, direction)
+        if position is None:
+            for size in sizes:
+                self.__failed.add(*size)
+        if self.__stats:
+            self.__stats.count("position_searches")
+            self.__stats.count("candidates", candidates)
+        return position
+
+    def __search(self, sizes, direction):
+        '''Returns the position and size or None and the number of the candidates tested'''
+        max_x, max_y = self.size
+        tried = 0
+        sizes = [(w, h) for w, h in sizes if w <= max_x and h <= max_y]
+        if not sizes:
+            return None, tried
+
+        # Each candidate costs one band query of the occupancy index for each size
+        if direction == 'bottom':
+            # The lowest position always rests on the floor or on a top of a box
+            lowest = min(h for _, h in sizes)
+            for y in self.__tops:
+                if y + lowest > max_y:
+                    break
+                tried += 1
+                found = self.__index.row_gaps(y, [(w, h) for w, h in sizes if y + h <= max_y])
+                if found is not None:
+                    x, w, h = found
+                    return (x, y, w, h), tried
+        elif direction == 'left_to_right':
+            # The leftmost position always touches the wall or a right edge of a box
+            narrowest = min(w for w, _ in sizes)
+            for x in self.__rights:
+                if x + narrowest > max_x:
+                    break
+                tried += 1
+                found = self.__index.column_gaps(x, [(w, h) for w, h in sizes if x + w <= max_x])
+                if found is not None:
+                    y, w, h = found
+                    return (x, y, w, h), tried
+        elif direction == 'right_to_left':
+            # The rightmost position always touches the wall or a left edge of a box
+            candidates = set()
+            for w, h in sizes:
+                candidates.update((x - w, w, h) for x in self.__lefts if x - w >= 0)
+                candidates.add((max_x - w, w, h))
+            found = None
+            for x, w, h in sorted(candidates, key=lambda c: -c[0]):
+                if found and x < found[0]:
+                    break
+                tried += 1
+                y = self.__index.column_gap(x, x + w, h)
+                if y is not None and (found is None or y < found[1]):
+                    found = (x, y, w, h)
+            if found:
+                return found, tried
+        return None, tried
+
+    def add(self, box: Box) -> None:
+        '''Adds already positioned box to the bin'''
+        x0, y0, x1, y1 = box.x, box.y, box.x + box.w, box.y + box.h
+        self.boxes.append(box)
+        self.free_area -= box.w * box.h
+        self.__index.add(x0, y0, x1, y1)
+        for edges, edge in ((self.__tops, y1), (self.__rights, x1), (self.__lefts, x0)):
+            i = bisect_left(edges, edge)
+            if i == len(edges) or edges[i] != edge:
+                edges.insert(i, edge)
+
+class MaxRectsBin:
+    '''
+    Single bin of the MaxRects algorithms\\
+    The free space is kept as the list of the maximal free rectangles, a
+    placed box splits the rectangles it overlaps and the new pieces
+    contained in another free rectangle are dropped
+    ### Values
+    - `.size` - (width, height) of the bin
+    - `.boxes` - list of the boxes placed in the bin
+    - `.free_area` - area of the bin not covered by the boxes
+    - `.free_space` - `(sizes, area)` of the free rectangles and the biggest one of them, for SpaceIndex
+    ### Arguments
+    - `bin_size` - (width, height) of the bin
+    - `rule` - how the free rectangle is chosen, one of `MaxRectsBin.RULES`:
+        - `'short_side'` - the smallest leftover of the shorter side
+        - `'area'` - the smallest free rectangle
+        - `'bottom_left'` - the lowest top of the box, then the leftmost
+        - `'contact'` - the longest edges touching the walls and the other boxes
+    - `stats` - optional SolveStats counting the searches and candidates
+    '''
+    RULES = ("short_side", "area", "bottom_left", "contact")
+
+    def __init__(self, bin_size: tuple, rule='short_side', stats=None):
+        self.size = bin_size
+        self.rule = rule
+        self.boxes: list[Box] = []
+        self.free_area = bin_size[0] * bin_size[1]
+        self.free_space = ([bin_size], self.free_area)
+        self.__stats = stats
+        self.__free = [(0, 0, bin_size[0], bin_size[1])]  # (x, y, w, h) of the maximal free rectangles
+        self.__failed = FailedSizes()
+        # Spans of the box edges on each line, contact lengths are summed from the edges on the lines of a box
+        self.__edges = ({}, {}, {}, {}) if rule == "contact" else None
+
+    def place(self, box: Box, rotate=False) -> bool:
+        '''Finds the position for the box by the rule of the bin and adds it, see PackingBin.place'''
+        position = self.find_position(box.w, box.h, rotate)
+        if position is None:
+            return False
+        box.x, box.y, box.w, box.h = position
+        self.add(box)
+        return True
+
+    def find_position(self, w, h, rotate=False):
+        '''Returns the best (x, y, w, h) for the box of size w x h by the rule of the bin or None'''
+        sizes = [(w, h), (h, w)] if rotate and w != h else [(w, h)]
+        sizes = [(w, h) for w, h in sizes if not self.__failed.covers(w, h)]
+        if not sizes:
+            if self.__stats:
+                self.__stats.count("pruned_searches")
+            return None
+
+        rule = self.rule
+        best, best_score = None, None
+        for fx, fy, fw, fh in self.__free:
+            for w, h in sizes:
+                if w > fw or h > fh:
+                    continue
+                if rule == "short_side":
+                    left_w, left_h = fw - w, fh - h
+                    score = (left_w, left_h) if left_w < left_h else (left_h, left_w)
+                elif rule == "area":
+                    score = (fw * fh - w * h, min(fw - w, fh - h))
+                elif rule == "bottom_left":
+                    score = (fy + h, fx)
+                else:
+                    score = (-self.__contact(fx, fy, fx + w, fy + h), fy, fx)
+                if best_score is None or score < best_score:
+                    best, best_score = (fx, fy, w, h), score
+
+        if best is None:
+            for size in sizes:
+                self.__failed.add(*size)
+        if self.__stats:
+            self.__stats.count("position_searches")
+            self.__stats.count("candidates", len(self.__free))
+        return best
+
+    def add(self, box: Box) -> None:
+        '''Adds already positioned box to the bin and splits the free rectangles it overlaps'''
+        x0, y0, x1, y1 = box.x, box.y, box.x + box.w, box.y + box.h
+        self.boxes.append(box)
+        self.free_area -= box.w * box.h
+        if self.__edges:
+            lefts, rights, bottoms, tops = self.__edges
+            lefts.setdefault(x0, []).append((y0, y1))
+            rights.setdefault(x1, []).append((y0, y1))
+            bottoms.setdefault(y0, []).append((x0, x1))
+            tops.setdefault(y1, []).append((x0, x1))
+
+        kept, pieces = [], []
+        for free in self.__free:
+            fx, fy, fw, fh = free
+            fx1, fy1 = fx + fw, fy + fh
+            if x0 >= fx1 or x1 <= fx or y0 >= fy1 or y1 <= fy:
+                kept.append(free)
+                continue
+            if x0 > fx:
+                pieces.append((fx, fy, x0 - fx, fh))
+            if x1 < fx1:
+                pieces.append((x1, fy, fx1 - x1, fh))
+            if y0 > fy:
+                pieces.append((fx, fy, fw, y0 - fy))
+            if y1 < fy1:
+                pieces.append((fx, y1, fw, fy1 - y1))
+
+        # The kept rectangles were maximal before, so only the pieces can be contained in another one
+        pieces.sort(key=lambda r: r[2] * r[3], reverse=True)
+        for piece in pieces:
+            px, py, pw, ph = piece
+            px1, py1 = px + pw, py + ph
+            for fx, fy, fw, fh in kept:
+                if fx <= px and fy <= py and px1 <= fx + fw and py1 <= fy + fh:
+                    break
+            else:
+                kept.append(piece)
+        self.__free = kept
+        self.free_space = ([(w, h) for _, _, w, h in kept], max((w * h for _, _, w, h in kept), default=0))
+
+    def __contact(self, x0, y0, x1, y1) -> int:
+        '''Returns the length of the edges of the rectangle touching the walls or the edges of the boxes'''
+        lefts, rights, bottoms, tops = self.__edges
+        width, height = self.size
+        length = (x1 - x0) * ((y0 == 0) + (y1 == height)) + (y1 - y0) * ((x0 == 0) + (x1 == width))
+        # Boxes do not overlap, so the spans on one line never count twice
+        for spans, start, end in ((rights.get(x0), y0, y1), (lefts.get(x1), y0, y1),
+                                  (tops.get(y0), x0, x1), (bottoms.get(y1), x0, x1)):
+            if spans:
+                for low, high in spans:
+                    if low < end and high > start:
+                        length += min(high, end) - max(low, start)
+        return length
+
+class SkylineBin:
+    '''
+    Single bin of the Skyline algorithms\\
+    The tops of the boxes are kept as a skyline of segments, a box is put on
+    the skyline and the space below it is lost. The segment of a placed box
+    replaces the segments it covers and is merged with neighbours of the
+    same height. The widest free rectangles resting on the skyline are kept,
+    a box only cuts the ones reaching down into it and adds the one on its top
+    ### Values
+    - `.size` - (width, height) of the bin
+    - `.boxes` - list of the boxes placed in the bin
+    - `.free_area` - area of the bin above the skyline
+    - `.free_space` - `(sizes, area)` of the widest rectangles on the skyline and the biggest one of them,
+    for SpaceIndex
+    ### Arguments
+    - `bin_size` - (width, height) of the bin
+    - `rule` - `'bottom_left'` for the lowest top of the box, `'min_waste'` for
+    the least space lost below the box, one of `SkylineBin.RULES`
+    - `stats` - optional SolveStats counting the searches and candidates
+    '''
+    RULES = ("bottom_left", "min_waste")
+
+    def __init__(self, bin_size: tuple, rule='bottom_left', stats=None):
+        self.size = bin_size
+        self.rule = rule
+        self.boxes: list[Box] = []
+        self.free_area = bin_size[0] * bin_size[1]
+        self.free_space = ([bin_size], self.free_area)
+        self.__stats = stats
+        # Segment i starts at xs[i], is ws[i] wide and ys[i] high, segments cover the whole width
+        self.__xs = [0]
+        self.__ys = [0]
+        self.__ws = [bin_size[0]]
+        # Widest free rectangles resting on the skyline, (start x, end x) -> free height, only an add changes them
+        self.__rects = {(0, bin_size[0]): bin_size[1]}
+        self.__failed = FailedSizes()
+
+    def place(self, box: Box, rotate=False) -> bool:
+        '''Finds the position for the box by the rule of the bin and adds it, see PackingBin.place'''
+        position = self.find_position(box.w, box.h, rotate)
+        if position is None:
+            return False
+        box.x, box.y, box.w, box.h = position
+        self.add(box)
+        return True
+
+    def find_position(self, w, h, rotate=False):
+        '''Returns the best (x, y, w, h) on the skyline for the box of size w x h by the rule of the bin or None'''
+        sizes = [(w, h), (h, w)] if rotate and w != h else [(w, h)]
+        sizes = [(w, h) for w, h in sizes if not self.__failed.covers(w, h)]
+        if not sizes:
+            if self.__stats:
+                self.__stats.count("pruned_searches")
+            return None
+
+        max_x, max_y = self.size
+        xs, ys, ws = self.__xs, self.__ys, self.__ws
+        min_waste = self.rule == "min_waste"
+        best, best_score = None, None
+        for w, h in sizes:
+            for i, x in enumerate(xs):
+                if x + w > max_x:
+                    break
+                # The box rests on the highest segment below it
+                y, covered, j = 0, 0, i
+                while covered < w:
+                    if ys[j] > y:
+                        y = ys[j]
+                        if y + h > max_y:
+                            break
+                    covered += ws[j]
+                    j += 1
+                if y + h > max_y:
+                    continue
+                if min_waste:
+                    below, covered = 0, 0
+                    for k in range(i, j):
+                        part = min(ws[k], w - covered)
+                        below += ys[k] * part
+                        covered += part
+                    score = (y * w - below, y + h, x)
+                else:
+                    score = (y + h, x)
+                if best_score is None or score < best_score:
+                    best, best_score = (x, y, w, h), score
+
+        if best is None:
+            for size in sizes:
+                self.__failed.add(*size)
+        if self.__stats:
+            self.__stats.count("position_searches")
+            self.__stats.count("candidates", len(xs))
+        return best
+
+    def add(self, box: Box) -> None:
+        '''Adds the box placed by find_position to the bin and raises the skyline over it'''
+        x0, x1, top = box.x, box.x + box.w, box.y + box.h
+        xs, ys, ws = self.__xs, self.__ys, self.__ws
+        self.boxes.append(box)
+
+        i = bisect_right(xs, x0) - 1    # Segment holding the left edge of the box
+        j = i
+        while j < len(xs) and xs[j] < x1:
+            self.free_area -= (top - ys[j]) * (min(xs[j] + ws[j], x1) - max(xs[j], x0))
+            j += 1
+        # Parts of the first and of the last covered segment outside the box stay
+        end = xs[j - 1] + ws[j - 1]
+        new_xs, new_ys, new_ws = [x0], [top], [x1 - x0]
+        if xs[i] < x0:
+            new_xs.insert(0, xs[i])
+            new_ys.insert(0, ys[i])
+            new_ws.insert(0, x0 - xs[i])
+        elif i > 0 and ys[i - 1] == top:
+            # The left neighbour of the same height is merged into the new segment
+            i -= 1
+            new_xs[0] = xs[i]
+            new_ws[0] += ws[i]
+        if end > x1:
+            new_xs.append(x1)
+            new_ys.append(ys[j - 1])
+            new_ws.append(end - x1)
+        elif j < len(xs) and ys[j] == top:
+            new_ws[-1] += ws[j]
+            j += 1
+        k = i + len(new_xs) - 1 - (end > x1)    # Segment of the box after the splice
+        xs[i:j], ys[i:j], ws[i:j] = new_xs, new_ys, new_ws
+        self.__update_rectangles(k, x0, x1, top)
+        sizes = [(right - left, free) for (left, right), free in self.__rects.items()]
+        self.free_space = (sizes, max((w * h for w, h in sizes), default=0))
+
+    def __update_rectangles(self, k, x0, x1, top) -> None:
+        '''
+        Updates the widest free rectangles for the box between x0 and x1 with its top
+        on the segment k, only the rectangles reaching down into the box are cut
+        '''
+        xs, ys, ws = self.__xs, self.__ys, self.__ws
+        rects = self.__rects
+        low = self.size[1] - top   # Free height left above the box
+        cut = [(start, end, free) for (start, end), free in rects.items()
+               if start < x1 and end > x0 and free > low]
+        for start, end, free in cut:
+            del rects[start, end]
+        # The parts beside the box keep their height, of the parts with the same span only the tallest is
+        # a widest rectangle, it comes from the rectangle resting on the lowest segment of the span
+        for start, end, free in cut:
+            for span in ((start, x0), (x1, end)):
+                if span[0] < span[1] and rects.get(span, 0) < free:
+                    rects[span] = free
+        if low > 0:
+            # The rectangle on the box spreads over the neighbours not higher than the box
+            i = j = k
+            while i > 0 and ys[i - 1] <= top:
+                i -= 1
+            while j + 1 < len(xs) and ys[j + 1] <= top:
+                j += 1
+            span = (xs[i], xs[j] + ws[j])
+            if rects.get(span, 0) < low:
+                rects[span] = low
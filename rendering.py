@@ -0,0 +1,182 @@
+'''
+Drawing of the packed bins on a Tk canvas
+
+    renderer = BinRenderer(canvas, result.bins, bin_size, colors)
+    renderer.render()
+
+Only the bins inside the scrolled view get canvas items, they are made
+when a bin scrolls in and deleted when it scrolls out, so opening a
+result costs the same for ten boxes and for a million. Labels are left out
+of boxes too small to read them. Bins with many boxes are drawn into a
+NumPy image instead of one rectangle for each box. Replays of a result file
+swap the bins for the ones of another step and redraw only the bins whose
+boxes changed.
+'''
+import tkinter as tk
+import numpy as np
+
+BINS_PER_ROW = 11
+BIN_SPACING = 1.1       # Distance of two bins in a row, in bin widths
+ROW_SPACING = 30        # Pixels between two rows of bins
+TOP_MARGIN = 40
+MAX_SCALE = 10.2        # Pixels per unit of the bin size on a 2560 pixels wide screen
+# Smallest box in pixels that gets a label, narrow boxes get it turned
+LABEL_MIN_LENGTH = 28
+LABEL_MIN_DEPTH = 12
+# Bins with more boxes are drawn as an image when raster is None
+RASTER_BOXES = 200
+OUTLINE = (255, 0, 0)
+
+class BinRenderer:
+    '''
+    Draws the bins visible in the scrolled view of the canvas
+    ### Arguments
+    - `canvas` - Tk canvas, its scrollregion is set by the renderer
+    - `bins` - list of bins with the placements of the boxes
+    - `bin_size` - (width, height) of the bins
+    - `colors` - '#rrggbb' colors of the boxes, the same for the i-th box of every bin
+    - `raster` - draw the boxes as an image: True, False or None for the bins with
+    more than `RASTER_BOXES` boxes
+    ### Values
+    - `.scale` - pixels per unit of the bin size
+    '''
+    def __init__(self, canvas: tk.Canvas, bins: list[list], bin_size: tuple, colors: list[str], raster=None):
+        self.canvas = canvas
+        self.bins = bins
+        self.bin_size = bin_size
+        self.raster = raster
+        self.__colors = colors
+        self.__rgb = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in colors], dtype=np.uint8)
+        self.__text_colors = ['white' if _luminance(rgb) <= 140 else 'black' for rgb in self.__rgb.tolist()]
+        self.__drawn: set[int] = set()
+        self.__images: dict[int, tk.PhotoImage] = {}  # Canvas images keep no reference of their own
+
+        # Small bins keep the size of the old drawing, big ones are fitted to the width of the screen
+        screen_width = canvas.winfo_screenwidth()
+        fit = screen_width / (BINS_PER_ROW * BIN_SPACING * bin_size[0])
+        self.scale = min(MAX_SCALE * screen_width / 2560, fit)
+        self.__layout()
+
+    def render(self) -> None:
+        '''Draws the bins which came into the view and deletes the ones which left it'''
+        canvas = self.canvas
+        left, top = canvas.canvasx(0), canvas.canvasy(0)
+        right = canvas.canvasx(max(canvas.winfo_width(), 1))
+        bottom = canvas.canvasy(max(canvas.winfo_height(), 1))
+
+        first_row = max(0, int((top - TOP_MARGIN) // self.__row_pitch))
+        last_row = min(self.__rows - 1, int((bottom - TOP_MARGIN) // self.__row_pitch))
+        first_col = max(0, int((left - self.__left) // self.__col_pitch))
+        last_col = min(BINS_PER_ROW - 1, int((right - self.__left) // self.__col_pitch))
+        visible = {row * BINS_PER_ROW + col
+                   for row in range(first_row, last_row + 1)
+                   for col in range(first_col, last_col + 1)
+                   if row * BINS_PER_ROW + col < len(self.bins)}
+
+        for i in self.__drawn - visible:
+            canvas.delete(f"bin{i}")
+            self.__images.pop(i, None)
+        for i in sorted(visible - self.__drawn):
+            self.__draw(i)
+        self.__drawn = visible
+
+    def redraw(self, indices) -> None:
+        '''Draws the bins with the indices again after their boxes changed, bins out of the view are skipped'''
+        for i in indices:
+            if i in self.__drawn:
+                self.canvas.delete(f"bin{i}")
+                self.__images.pop(i, None)
+                self.__draw(i)
+
+    def zoom(self, factor: float) -> None:
+        '''Changes the scale by the factor, keeping the same part of the bins in the view'''
+        x_view, y_view = self.canvas.xview()[0], self.canvas.yview()[0]
+        self.clear()
+        self.scale *= factor
+        self.__layout()
+        self.canvas.xview_moveto(x_view)
+        self.canvas.yview_moveto(y_view)
+        self.render()
+
+    def clear(self) -> None:
+        '''Deletes the items of every drawn bin'''
+        for i in self.__drawn:
+            self.canvas.delete(f"bin{i}")
+        self.__drawn.clear()
+        self.__images.clear()
+
+    def xview(self, *args) -> None:
+        '''Scrolls the canvas horizontally like `Canvas.xview` and draws the new bins'''
+        self.canvas.xview(*args)
+        self.render()
+
+    def yview(self, *args) -> None:
+        '''Scrolls the canvas vertically like `Canvas.yview` and draws the new bins'''
+        self.canvas.yview(*args)
+        self.render()
+
+    def __layout(self) -> None:
+        '''Places the rows of the bins for the current scale and sets the scrollregion'''
+        bin_width, bin_height = self.bin_size
+        self.__col_pitch = self.scale * BIN_SPACING * bin_width
+        self.__row_pitch = self.scale * bin_height + ROW_SPACING
+        self.__rows = max(1, -(-len(self.bins) // BINS_PER_ROW))
+        row_width = BINS_PER_ROW * self.__col_pitch
+        self.__left = max(0.0, (self.canvas.winfo_screenwidth() - row_width) / 2)
+        self.canvas.config(scrollregion=(0, 0, max(self.canvas.winfo_screenwidth(), self.__left * 2 + row_width),
+                                         TOP_MARGIN + self.__rows * self.__row_pitch))
+
+    def __origin(self, i) -> tuple:
+        row, col = divmod(i, BINS_PER_ROW)
+        return self.__left + col * self.__col_pitch, TOP_MARGIN + row * self.__row_pitch
+
+    def __draw(self, i) -> None:
+        x, y = self.__origin(i)
+        bin = self.bins[i]
+        tag = ("bins", f"bin{i}")
+        if self.raster or (self.raster is None and len(bin) > RASTER_BOXES):
+            self.__draw_image(i, bin, x, y, tag)
+        else:
+            for j, p in enumerate(bin):
+                x0, y0 = x + p.x * self.scale, y + p.y * self.scale
+                self.canvas.create_rectangle(x0, y0, x0 + p.w * self.scale, y0 + p.h * self.scale,
+                                             outline='red', fill=self.__colors[j % len(self.__colors)], tags=tag)
+        self.__draw_labels(bin, x, y, tag)
+        self.canvas.create_rectangle(x, y, x + self.bin_size[0] * self.scale, y + self.bin_size[1] * self.scale,
+                                     outline='black', tags=tag)
+
+    def __draw_image(self, i, bin, x, y, tag) -> None:
+        '''Draws the boxes of the bin into an RGB array and puts it on the canvas as a single image'''
+        scale = self.scale
+        width = max(1, round(self.bin_size[0] * scale))
+        height = max(1, round(self.bin_size[1] * scale))
+        pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+        for j, p in enumerate(bin):
+            x0, y0 = round(p.x * scale), round(p.y * scale)
+            x1, y1 = max(x0 + 1, round((p.x + p.w) * scale)), max(y0 + 1, round((p.y + p.h) * scale))
+            pixels[y0:y1, x0:x1] = OUTLINE
+            if x1 - x0 > 2 and y1 - y0 > 2:
+                pixels[y0 + 1:y1 - 1, x0 + 1:x1 - 1] = self.__rgb[j % len(self.__rgb)]
+        # Tk reads binary PPM data without any imaging library
+        image = tk.PhotoImage(data=b"P6 %d %d 255\n" % (width, height) + pixels.tobytes(), format="PPM")
+        self.__images[i] = image
+        self.canvas.create_image(x, y, image=image, anchor=tk.NW, tags=tag)
+
+    def __draw_labels(self, bin, x, y, tag) -> None:
+        '''Writes the size on every box big enough to read it'''
+        for j, p in enumerate(bin):
+            w, h = p.w * self.scale, p.h * self.scale
+            if w >= LABEL_MIN_LENGTH and h >= LABEL_MIN_DEPTH:
+                angle = 0
+            elif h >= LABEL_MIN_LENGTH and w >= LABEL_MIN_DEPTH:
+                angle = 90
+            else:
+                continue
+            self.canvas.create_text(x + p.x * self.scale + w / 2, y + p.y * self.scale + h / 2,
+                                    text=f'{p.w}x{p.h}', font=('Arial', 8), angle=angle,
+                                    fill=self.__text_colors[j % len(self.__text_colors)], tags=tag)
+
+def _luminance(rgb) -> float:
+    '''Returns the luminance of the color, dark colors get white labels'''
+    red, green, blue = rgb
+    return red * 0.2126 + green * 0.7152 + blue * 0.0722
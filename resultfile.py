@@ -0,0 +1,154 @@
+'''
+Binary result files with the placement log of a packing
+
+    write_result("result.bpr", bss.bin_size, result, bss.boxes)
+    with ResultFile("result.bpr") as replay:
+        bins = replay.bins(step)
+
+A file is a header with the bin size, the algorithm name and the counts, then
+one `(box, bin, x, y, w, h)` record for every placed box in the order the
+boxes were packed, so the step of a record is its position. The records are
+followed by an index of the steps grouped by bin. Everything is read from a
+memory map without parsing, opening a file and reading any range of the
+steps or the boxes of a bin up to a step do not depend on the size of the
+packing.
+'''
+import mmap
+import os
+import struct
+from typing import NamedTuple
+import numpy as np
+from helpers import SolveResult, ValidationError
+
+MAGIC = b"BPRF"
+VERSION = 1
+# Magic, version, bin width, bin height, number of the steps, number of the bins, algorithm name
+HEADER = struct.Struct("<4sH2xQQQQ32s")
+RECORD = np.dtype([("box", "<u4"), ("bin", "<u4"), ("x", "<u4"), ("y", "<u4"), ("w", "<u4"), ("h", "<u4")])
+MAX_VALUE = (1 << 32) - 1
+
+class Step(NamedTuple):
+    '''Placement of a single box, the renderer draws it like a Placement'''
+    box: int
+    bin: int
+    x: int
+    y: int
+    w: int
+    h: int
+
+def write_result(path: str, bin_size: tuple, result: SolveResult, boxes: list) -> None:
+    '''
+    Writes the result as a result file
+    ### Arguments
+    - `path` - path of the file
+    - `bin_size` - (width, height) of the bins
+    - `result` - SolveResult, its `.order` gives the steps
+    - `boxes` - the solved boxes, records refer to the boxes by their index in this list
+    '''
+    index = {id(box): i for i, box in enumerate(boxes)}
+    bin_of = {id(p): i for i, bin in enumerate(result.bins) for p in bin}
+    bin_width, bin_height = bin_size
+    if max(bin_width, bin_height, len(boxes), len(result.bins)) > MAX_VALUE:
+        raise ValidationError("Result is too big for a result file", "result_file")
+    steps = np.fromiter(((index[id(p.box)], bin_of[id(p)], p.x, p.y, p.w, p.h) for p in result.order),
+                        dtype=RECORD, count=len(result.order))
+    # Steps of every bin in their order, bin i has steps[order[starts[i]:starts[i + 1]]]
+    order = np.argsort(steps["bin"], kind="stable").astype("<u4")
+    starts = np.searchsorted(steps["bin"][order], np.arange(len(result.bins) + 1)).astype("<u8")
+
+    name = result.name.encode()[:32]
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, bin_width, bin_height, len(steps), len(result.bins), name))
+        steps.tofile(file)
+        starts.tofile(file)
+        order.tofile(file)
+
+class ResultFile:
+    '''
+    Read-only view of a result file
+    ### Arguments
+    - `path` - path of the file written by write_result
+    ### Values
+    - `.path` - path of the file
+    - `.bin_size` - (width, height) of the bins
+    - `.algorithm` - name of the algorithm
+    - `.bin_count` - number of the bins
+    - `len(result_file)` - number of the steps
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValidationError(f"Not a result file: {path}", "result_file")
+            self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, bin_width, bin_height, steps, bins, name = HEADER.unpack_from(self.__map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValidationError(f"Not a result file: {path}", "result_file")
+        if size != HEADER.size + steps * (RECORD.itemsize + 4) + (bins + 1) * 8:
+            self.close()
+            raise ValidationError(f"Result file is truncated: {path}", "result_file")
+        self.bin_size = (bin_width, bin_height)
+        self.algorithm = name.rstrip(b"\0").decode(errors="replace")
+        self.bin_count = bins
+        offset = HEADER.size
+        self.__steps = np.frombuffer(self.__map, RECORD, steps, offset)
+        offset += steps * RECORD.itemsize
+        self.__starts = np.frombuffer(self.__map, "<u8", bins + 1, offset)
+        offset += (bins + 1) * 8
+        self.__order = np.frombuffer(self.__map, "<u4", steps, offset)
+
+    def __len__(self):
+        return len(self.__steps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def steps(self, start=0, stop=None) -> np.ndarray:
+        '''Returns the records of the steps in the range as a view of the file'''
+        return self.__steps[start:stop]
+
+    def bin(self, i: int, stop=None) -> list[Step]:
+        '''Returns the boxes of bin i placed before the step `stop`, in their order'''
+        steps = self.__order[self.__starts[i]:self.__starts[i + 1]]
+        if stop is not None:
+            steps = steps[:np.searchsorted(steps, stop)]
+        return [Step(*record) for record in self.__steps[steps].tolist()]
+
+    def bins(self, stop=None) -> "ReplayBins":
+        '''Returns the bins as they were before the step `stop`, for BinRenderer'''
+        return ReplayBins(self, stop)
+
+    def changed_bins(self, start: int, stop: int) -> list[int]:
+        '''Returns the bins getting a box in the steps between start and stop, in any direction'''
+        start, stop = min(start, stop), max(start, stop)
+        return np.unique(self.__steps["bin"][start:stop]).tolist()
+
+    def close(self) -> None:
+        '''Unmaps the file, arrays taken from `steps` must not be used after it'''
+        self.__steps = self.__starts = self.__order = None
+        try:
+            self.__map.close()
+        except BufferError:
+            pass    # Views still held by the caller keep the map open until they are freed
+
+class ReplayBins:
+    '''
+    Bins of a result file up to a step, read only when a bin is drawn\\
+    Every bin of the packing is present, the ones without a box yet are empty
+    '''
+    def __init__(self, result_file: ResultFile, stop=None):
+        self.__file = result_file
+        self.__stop = stop
+
+    def __len__(self):
+        return self.__file.bin_count
+
+    def __getitem__(self, i: int) -> list[Step]:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.__file.bin(i, self.__stop)
@@ -0,0 +1,515 @@
+from bisect import bisect_left, bisect_right
+from heapq import heappop, heappush
+
+class FirstFitIndex:
+    '''
+    Remaining capacities of strips or bins kept in a max segment tree\\
+    Finding the first element that can hold an item costs O(log n). The tree is
+    a list of levels that grows by one node per level when an element is added,
+    so appending never rebuilds it
+    ### Usage
+    - `index.append(capacity)` - adds a new element at the end
+    - `index[i]` and `index[i] = capacity` - read and update the capacity
+    - `index.first_fit(size)` - index of the first element with capacity >= size
+    - `index.copy()` - independent copy to go back to later
+    '''
+    def __init__(self, capacities=()):
+        self.__length = 0
+        # Level 0 keeps the leaves, node i of a level keeps the max of nodes 2i and 2i+1
+        # of the level below. Every level but the top has an even length, padded with -1,
+        # the top has a single node
+        self.__levels: list[list] = [[-1]]
+        if capacities:
+            self.__build(list(capacities))
+
+    def __len__(self):
+        return self.__length
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.__length:
+            raise IndexError("FirstFitIndex index out of range")
+        return self.__levels[0][i]
+
+    def __setitem__(self, i, capacity):
+        if not 0 <= i < self.__length:
+            raise IndexError("FirstFitIndex index out of range")
+        levels = self.__levels
+        level = levels[0]
+        level[i] = capacity
+        for parent in levels[1:]:
+            left, right = level[i & ~1], level[i | 1]
+            biggest = left if left > right else right
+            i >>= 1
+            if parent[i] == biggest:
+                break # Nothing changes above this node
+            parent[i] = biggest
+            level = parent
+
+    def append(self, capacity) -> int:
+        '''Adds the element at the end and returns its index'''
+        i = self.__length
+        self.__length += 1
+        levels = self.__levels
+        if i < len(levels[0]):
+            self[i] = capacity # Takes the padding leaf
+            return i
+        # Add a node to the levels that end below it, then raise the nodes above it
+        j = i
+        for level in levels:
+            if j == len(level):
+                if len(level) == 1:
+                    # A top with two nodes gets a new top
+                    level.append(capacity)
+                    levels.append([level[0] if level[0] > capacity else capacity])
+                    break
+                level += (capacity, -1)
+            elif level[j] < capacity:
+                level[j] = capacity
+            else:
+                break
+            j >>= 1
+        return i
+
+    def max(self):
+        '''Returns the biggest capacity or -1 if there are no elements'''
+        return self.__levels[-1][0]
+
+    def copy(self) -> 'FirstFitIndex':
+        '''Returns an independent copy of the index, it costs one copy of the tree'''
+        index = FirstFitIndex()
+        index.__length, index.__levels = self.__length, [level[:] for level in self.__levels]
+        return index
+
+    def first_fit(self, size, start=0):
+        '''Returns the index of the first element from start with capacity >= size or None'''
+        if start >= self.__length:
+            return None
+        levels = self.__levels
+        top = len(levels) - 1
+        # Searching from the beginning can start straight from the top
+        depth, i = (0, start) if start else (top, 0)
+        while True:
+            if levels[depth][i] >= size:
+                # Go down to the leftmost leaf that can hold the size
+                while depth:
+                    depth -= 1
+                    i = 2 * i if levels[depth][2 * i] >= size else 2 * i + 1
+                return i
+            # Move to the next subtree on the right
+            while i & 1:
+                i >>= 1
+                depth += 1
+            if depth == top:
+                return None
+            i += 1
+
+    def __build(self, leaves: list) -> None:
+        '''Builds the tree over the leaves'''
+        self.__length = len(leaves)
+        self.__levels = [leaves]
+        while len(leaves) > 1:
+            if len(leaves) & 1:
+                leaves.append(-1)
+            leaves = list(map(max, leaves[::2], leaves[1::2]))
+            self.__levels.append(leaves)
+
+class KeySet:
+    '''
+    Set of non-negative integer keys kept as a sparse tree of 64 bit words\\
+    Level 0 has a bit for every key, every higher level has a bit for each
+    non-empty word of the level below. Adding a key, removing it and finding the
+    smallest key not below a value touch one word of each level, so they cost
+    O(log64 of the biggest key), and memory grows with the number of the keys
+    ### Usage
+    - `keys.add(key)` and `keys.remove(key)` - add and remove a key
+    - `keys.successor(value)` - smallest key >= value or None
+    - `keys.copy()` - independent copy
+    '''
+    def __init__(self):
+        self.__levels: list[dict[int, int]] = [{}]  # Word index -> bits of the words of each level
+
+    def add(self, key) -> None:
+        levels = self.__levels
+        while key >> 6 * len(levels):
+            # The top level has a single word, a new level above it keeps the top under one word
+            levels.append({0: 1} if levels[-1] else {})
+        for level in levels:
+            word = key >> 6
+            bits = level.get(word, 0)
+            level[word] = bits | 1 << (key & 63)
+            if bits:
+                break # The word was already marked in the levels above
+            key = word
+
+    def remove(self, key) -> None:
+        for level in self.__levels:
+            word = key >> 6
+            bits = level[word] & ~(1 << (key & 63))
+            if bits:
+                level[word] = bits
+                break
+            del level[word]
+            key = word
+
+    def successor(self, value):
+        '''Returns the smallest key >= value or None'''
+        levels = self.__levels
+        key = value if value > 0 else 0
+        bits = levels[0].get(key >> 6, 0) >> (key & 63)
+        if bits: # Most keys are found in the word of the value
+            return key + (bits & -bits).bit_length() - 1
+        # Go up until a word has a key after the value, then down to its lowest key
+        depth = 0
+        while bits == 0:
+            depth += 1
+            if depth == len(levels):
+                return None
+            key = (key >> 6) + 1
+            bits = levels[depth].get(key >> 6, 0) >> (key & 63)
+        key += (bits & -bits).bit_length() - 1
+        while depth:
+            depth -= 1
+            bits = levels[depth][key]
+            key = (key << 6) + (bits & -bits).bit_length() - 1
+        return key
+
+    def copy(self) -> 'KeySet':
+        keys = KeySet()
+        keys.__levels = [level.copy() for level in self.__levels]
+        return keys
+
+class BestFitIndex:
+    '''
+    Remaining capacities of strips or bins grouped by their value\\
+    Only the capacities that have elements are kept, in a KeySet, so finding the
+    element with the smallest capacity that can hold an item and changing a
+    capacity cost O(log n + log64 of the capacity), ties are won by the element
+    with the lowest index. Memory grows with the number of elements, not with the
+    size of the capacities
+    ### Usage
+    - `index.append(capacity)` - adds a new element at the end
+    - `index[i]` and `index[i] = capacity` - read and update the capacity
+    - `index.best_fit(size)` - index of the element with the smallest capacity >= size
+    - `index.copy()` - independent copy to go back to later
+    '''
+    def __init__(self):
+        self.__capacities = []
+        self.__keys = KeySet()  # Capacities that have elements
+        self.__counts = {}      # Number of elements with each capacity
+        self.__elements = {}    # Heaps of element indices by capacity, may hold stale ones
+
+    def __len__(self):
+        return len(self.__capacities)
+
+    def __getitem__(self, i):
+        return self.__capacities[i]
+
+    def __setitem__(self, i, capacity):
+        old = self.__capacities[i]
+        self.__capacities[i] = capacity
+        self.__remove(old)
+        self.__insert(i, capacity)
+
+    def append(self, capacity) -> int:
+        '''Adds the element at the end and returns its index'''
+        self.__capacities.append(capacity)
+        self.__insert(len(self.__capacities) - 1, capacity)
+        return len(self.__capacities) - 1
+
+    def copy(self) -> 'BestFitIndex':
+        '''Returns an independent copy of the index'''
+        index = BestFitIndex()
+        index.__capacities = self.__capacities[:]
+        index.__keys = self.__keys.copy()
+        index.__counts = self.__counts.copy()
+        index.__elements = {capacity: elements[:] for capacity, elements in self.__elements.items()}
+        return index
+
+    def best_fit(self, size):
+        '''Returns the index of the first element with the smallest capacity >= size or None'''
+        capacity = self.__keys.successor(size)
+        if capacity is None:
+            return None
+        elements = self.__elements[capacity]
+        while self.__capacities[elements[0]] != capacity: # Drop elements that moved away
+            heappop(elements)
+        return elements[0]
+
+    def __insert(self, i, capacity) -> None:
+        count = self.__counts.get(capacity, 0)
+        if count == 0:
+            self.__keys.add(capacity)
+            self.__elements[capacity] = [i]
+        else:
+            heappush(self.__elements[capacity], i)
+        self.__counts[capacity] = count + 1
+
+    def __remove(self, capacity) -> None:
+        count = self.__counts[capacity] - 1
+        if count == 0:
+            self.__keys.remove(capacity)
+            del self.__counts[capacity]
+            del self.__elements[capacity]
+        else:
+            self.__counts[capacity] = count
+
+class SpaceIndex:
+    '''
+    Free space of every bin kept in a max segment tree\\
+    Each node keeps, for a few steps of the width, the biggest height of a
+    free rectangle at least that wide in any bin below it, the same for the
+    steps of the height and the biggest free area. A box can only go into a bin
+    with enough of all three, so the search skips every subtree without them
+    and rarely walks down to a bin that does not fit. The values of a node are
+    packed into one integer, each in a field with a spare top bit, so the
+    maximum of two nodes and the check of a node take a few integer operations
+    ### Arguments
+    - `bin_size` - (width, height) of the bins
+    - `steps` - number of the steps of each size, more steps skip more bins but cost more to update
+    ### Usage
+    - `index.append(space)` - adds a new bin at the end, `space` is `(sizes, area)` of
+    the (width, height) of its free rectangles and the biggest free area
+    - `index[i] = space` - updates the free space of the bin
+    - `index.first_fit(w, h, start, rotate)` - index of the first bin from start that may fit the box
+    '''
+    def __init__(self, bin_size: tuple, steps=16):
+        self.__width, self.__height = bin_size
+        steps = min(steps, *bin_size)
+        self.__steps = steps
+        self.__length = 0
+        self.__size = 1
+        # Fields 0 to steps - 1 keep the heights, steps to 2 * steps - 1 the widths, the last one the area
+        self.__bits = max(bin_size[0] * bin_size[1], *bin_size).bit_length() + 1
+        self.__ones = [0]   # Lowest bits of the first i fields
+        for field in range(2 * steps + 1):
+            self.__ones.append(self.__ones[-1] | 1 << field * self.__bits)
+        self.__tops = self.__ones[-1] << self.__bits - 1
+        # Node i keeps the max of nodes 2i and 2i+1, leaves start at __size, the top bits of the fields are always set
+        self.__tree = [self.__tops, self.__tops]
+        # Widths increasing and heights decreasing of the free rectangles of each bin not covered by another one
+        self.__widths: list[list] = []
+        self.__heights: list[list] = []
+
+    def __len__(self):
+        return self.__length
+
+    def __setitem__(self, i, space):
+        if not 0 <= i < self.__length:
+            raise IndexError("SpaceIndex index out of range")
+        sizes, area = space
+        widths, heights = self.__widths[i], self.__heights[i] = self.__frontier(sizes)
+        tree, tops, shift = self.__tree, self.__tops, self.__bits - 1
+        i += self.__size
+        node = self.__node(widths, heights, area)
+        if tree[i] == node:
+            return
+        tree[i] = node
+        i >>= 1
+        while i:
+            a, b = tree[2 * i], tree[2 * i + 1]
+            # The top bit of a field stays set where a is not smaller, it is spread over the field below it
+            bigger = (a - (b ^ tops)) & tops
+            node = b ^ ((a ^ b) & (bigger - (bigger >> shift)))
+            if tree[i] == node:
+                break # Nothing changes above this node
+            tree[i] = node
+            i >>= 1
+
+    def append(self, space) -> int:
+        '''Adds the bin at the end and returns its index'''
+        if self.__length == self.__size:
+            self.__grow()
+        self.__length += 1
+        self.__widths.append(None)
+        self.__heights.append(None)
+        self[self.__length - 1] = space
+        return self.__length - 1
+
+    def first_fit(self, w, h, start=0, rotate=False):
+        '''Returns the index of the first bin from start with a free rectangle for the box or None'''
+        if start >= self.__length:
+            return None
+        tree, size = self.__tree, self.__size
+        widths, heights = self.__widths, self.__heights
+        # A node fits the box if none of the fields of the query borrows the top bit of the node
+        upright, upright_fields = self.__query(w, h)
+        turned, turned_fields = self.__query(h, w) if rotate else (None, None)
+        i = start + size
+        while not i & 1:
+            i >>= 1     # The search starts from the biggest subtree beginning with the start bin
+        while True:
+            node = tree[i]
+            if ((node - upright) & upright_fields == upright_fields or
+                    (rotate and (node - turned) & turned_fields == turned_fields)):
+                if i < size:
+                    i *= 2  # Go down to the left child first
+                    continue
+                # Sizes are rounded down to a step, so a node may pass without a fitting bin below it,
+                # the free rectangles of a bin decide and the search goes on to the right
+                leaf = i - size
+                j = bisect_left(widths[leaf], w)
+                if j < len(widths[leaf]) and heights[leaf][j] >= h:
+                    return leaf
+                if rotate:
+                    j = bisect_left(widths[leaf], h)
+                    if j < len(widths[leaf]) and heights[leaf][j] >= w:
+                        return leaf
+            # Move to the next subtree on the right
+            while i & 1:
+                i >>= 1
+            if i == 0:
+                return None
+            i += 1
+
+    def __query(self, w, h) -> tuple:
+        '''Returns the node with only the height, the width and the area the box needs, and the top bits of them'''
+        steps, bits = self.__steps, self.__bits
+        fields = (min(steps - 1, w * steps // self.__width), min(steps - 1, h * steps // self.__height) + steps,
+                  2 * steps)
+        query = (h << fields[0] * bits) | (w << fields[1] * bits) | (w * h << fields[2] * bits)
+        top = 1 << bits - 1
+        return query, (top << fields[0] * bits) | (top << fields[1] * bits) | (top << fields[2] * bits)
+
+    @staticmethod
+    def __frontier(sizes) -> tuple:
+        '''Returns the widths and heights of the sizes not covered by another one'''
+        widths, heights = [], []
+        for w, h in sorted(sizes, reverse=True):
+            if not heights or h > heights[-1]:
+                widths.append(w)
+                heights.append(h)
+        return widths[::-1], heights[::-1]
+
+    def __node(self, widths, heights, area) -> int:
+        '''
+        Returns the node of a bin with the frontier of its free space, the biggest height of the
+        rectangles at least as wide as each step, the biggest width of the ones at least as tall
+        as each step, then the area
+        '''
+        steps, ones = self.__steps, self.__ones
+        node = area << 2 * steps * self.__bits
+        # The narrowest size reaching a width step is the tallest, it fills the steps up to its own
+        done = 0
+        for w, h in zip(widths, heights):
+            step = min(steps - 1, w * steps // self.__width) + 1
+            if step > done:
+                node |= h * (ones[step] - ones[done])
+                done = step
+        # The same for the heights from the widest size
+        done = steps
+        for w, h in zip(reversed(widths), reversed(heights)):
+            step = min(steps - 1, h * steps // self.__height) + steps + 1
+            if step > done:
+                node |= w * (ones[step] - ones[done])
+                done = step
+        return node | self.__tops
+
+    def __grow(self) -> None:
+        '''Doubles the number of leaves and rebuilds the tree'''
+        leaves = self.__tree[self.__size:self.__size + self.__length]
+        self.__size *= 2
+        tree = [self.__tops] * (2 * self.__size)
+        tree[self.__size:self.__size + len(leaves)] = leaves
+        tops, shift = self.__tops, self.__bits - 1
+        for i in range(self.__size - 1, 0, -1):
+            a, b = tree[2 * i], tree[2 * i + 1]
+            bigger = (a - (b ^ tops)) & tops
+            tree[i] = b ^ ((a ^ b) & (bigger - (bigger >> shift)))
+        self.__tree = tree
+
+class FailedSizes:
+    '''
+    Sizes of the boxes which did not fit into a bin that only gets fuller\\
+    Only the sizes not bigger in both sides than another failed size are
+    kept, ordered by increasing width and so by decreasing height, so
+    checking a size costs O(log n), adding one also removes the sizes it covers
+    ### Usage
+    - `failed.add(w, h)` - records that a box of size w x h did not fit
+    - `failed.covers(w, h)` - True if a box of size w x h cannot fit either
+    '''
+    def __init__(self):
+        self.__widths = []
+        self.__heights = []
+
+    def __len__(self):
+        return len(self.__widths)
+
+    def covers(self, w, h) -> bool:
+        '''Checks if a size not bigger than w x h in both sides already failed'''
+        i = bisect_right(self.__widths, w) - 1
+        # The narrower failed sizes get taller to the left, the last one is the lowest
+        return i >= 0 and self.__heights[i] <= h
+
+    def add(self, w, h) -> None:
+        '''Records the failed size and drops the failed sizes it covers'''
+        if self.covers(w, h):
+            return
+        widths, heights = self.__widths, self.__heights
+        start = end = bisect_left(widths, w)
+        while end < len(heights) and heights[end] >= h:
+            end += 1
+        widths[start:end] = [w]
+        heights[start:end] = [h]
+
+class FloorCeilingShelf:
+    '''
+    Shelf of the Floor-Ceiling algorithm\\
+    Boxes are packed left-justified on the floor and right-justified
+    against the ceiling. Boxes must come in decreasing height order, so the
+    floor and the ceiling boxes get lower towards each other, and only the
+    boxes too tall to pass each other limit the free space
+    ### Values
+    - `.width and .height` - size of the shelf
+    - `.boxes` - boxes on the shelf, with x and y relative to the shelf
+    '''
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.boxes = []
+        self.floor_x = 0            # Right edge of the floor boxes
+        self.ceiling_x = width      # Left edge of the ceiling boxes
+        self.__floor_ends = []      # Right edges of the floor boxes, increasing
+        self.__floor_heights = []   # Negated heights of the floor boxes, increasing
+        self.__ceiling_starts = []  # Left edges of the ceiling boxes, decreasing
+        self.__ceiling_heights = [] # Negated heights of the ceiling boxes, increasing
+
+    def place_floor(self, box) -> None:
+        box.x, box.y = self.floor_x, 0
+        self.floor_x += box.w
+        self.__floor_ends.append(self.floor_x)
+        self.__floor_heights.append(-box.h)
+        self.boxes.append(box)
+
+    def place_ceiling(self, box) -> None:
+        self.ceiling_x -= box.w
+        box.x, box.y = self.ceiling_x, self.height - box.h
+        self.__ceiling_starts.append(self.ceiling_x)
+        self.__ceiling_heights.append(-box.h)
+        self.boxes.append(box)
+
+    def spaces(self, h) -> tuple:
+        '''
+        Returns the free space for the boxes of height h
+        ### Returns
+        `(floor space, ceiling space, next change)`, the widest box that fits on
+        the floor and against the ceiling, and the highest box height below h for
+        which the space grows or None if it never does
+        '''
+        # Boxes taller than this are blocking, on both sides they are the outermost ones
+        limit = h - self.height
+        floor_blocking = bisect_left(self.__floor_heights, limit)
+        ceiling_blocking = bisect_left(self.__ceiling_heights, limit)
+
+        floor_end = self.__ceiling_starts[ceiling_blocking - 1] if ceiling_blocking else self.width
+        ceiling_start = self.__floor_ends[floor_blocking - 1] if floor_blocking else 0
+
+        # The lowest blocking box stops blocking the boxes which are low enough to pass it
+        change = None
+        if floor_blocking:
+            change = self.height + self.__floor_heights[floor_blocking - 1]
+        if ceiling_blocking:
+            passing = self.height + self.__ceiling_heights[ceiling_blocking - 1]
+            if change is None or passing > change:
+                change = passing
+        if change is not None and change <= 0:
+            change = None
+        return floor_end - self.floor_x, self.ceiling_x - ceiling_start, change